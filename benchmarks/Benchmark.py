@@ -0,0 +1,277 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import re
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "vm_emulator"))
+sys.path.insert(0, os.path.join(HERE, "..", "compiler"))
+
+from Parser import Parser
+from CodeWriter import CodeWriter
+from PeepholeOptimizer import PeepholeOptimizer
+from JackTokenizer import JackTokenizer
+from Workloads import VM_WORKLOADS, JACK_WORKLOADS, leaf_calls
+
+VM_TRANSLATOR = os.path.join(HERE, "..", "vm_emulator", "Main.py")
+
+# Workload sizes at --scale 1
+DEFAULT_SIZES = {
+    "call_chain": 2000,
+    "compare_loops": 1000,
+    "many_statics": 200,
+    "jack_source": 500,
+}
+
+# CodeWriter configurations, as in Main.py's -O and -c flags
+CODEGEN_MODES = {
+    "plain": {"optimize": False, "compact": False},
+    "optimize": {"optimize": True, "compact": False},
+    "compact": {"optimize": False, "compact": True},
+}
+
+# ==========================================
+# Stages
+# ==========================================
+
+def parse_files(vm_files):
+    return [(os.path.basename(path).replace('.vm', ''), list(Parser(path))) for path in vm_files]
+
+def generate_code(parsed, optimize, compact):
+    """
+    Translates already parsed files like Main.py's directory mode.
+    Returns the assembly text.
+    """
+    buffer = io.StringIO()
+    optimizer = PeepholeOptimizer() if optimize else None
+    code_writer = CodeWriter(buffer, optimizer, compact=compact)
+    code_writer.write_init()
+    for file_name, commands in parsed:
+        code_writer.set_file_name(file_name)
+        for command in commands:
+            code_writer.write_command(command)
+    code_writer.close()
+    return buffer.getvalue()
+
+def tokenize(jack_files):
+    """
+    Walks every token the way JackAnalyzer does. Returns the token count.
+    """
+    count = 0
+    for path in jack_files:
+        tokenizer = JackTokenizer(path)
+        while tokenizer.has_more_tokens():
+            tokenizer.advance()
+            tokenizer.token_type()
+            count += 1
+    return count
+
+def count_instructions(assembly):
+    count = 0
+    for line in assembly.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//") and not line.startswith("("):
+            count += 1
+    return count
+
+# ==========================================
+# Measurement
+# ==========================================
+
+def measure(stage, repeat):
+    """
+    Runs stage() repeat times for the best wall time, then once more under
+    tracemalloc for the peak memory (kept apart so tracing does not skew
+    the timing). Returns (result, seconds, peak bytes).
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = stage()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+def run_benchmarks(scale, repeat, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, generate in VM_WORKLOADS.items():
+            size = max(1, int(DEFAULT_SIZES[name] * scale))
+            workload_dir = os.path.join(directory, name)
+            os.makedirs(workload_dir)
+            vm_files = generate(workload_dir, size)
+
+            parsed, seconds, peak = measure(lambda: parse_files(vm_files), repeat)
+            commands = sum(len(commands) for _, commands in parsed)
+            results.append({
+                "workload": name, "size": size, "stage": "Parser",
+                "seconds": seconds, "peak_bytes": peak, "commands": commands,
+            })
+            log(f"{name:14} Parser               {seconds:8.3f}s  {peak / 1e6:7.1f} MB  {commands} commands")
+
+            for mode, options in CODEGEN_MODES.items():
+                assembly, seconds, peak = measure(lambda: generate_code(parsed, **options), repeat)
+                instructions = count_instructions(assembly)
+                results.append({
+                    "workload": name, "size": size, "stage": f"CodeWriter/{mode}",
+                    "seconds": seconds, "peak_bytes": peak, "commands": commands,
+                    "instructions": instructions,
+                })
+                log(f"{name:14} CodeWriter/{mode:9} {seconds:8.3f}s  {peak / 1e6:7.1f} MB  "
+                    f"{instructions} instructions")
+
+        for name, generate in JACK_WORKLOADS.items():
+            size = max(1, int(DEFAULT_SIZES[name] * scale))
+            workload_dir = os.path.join(directory, name)
+            os.makedirs(workload_dir)
+            jack_files = generate(workload_dir, size)
+
+            tokens, seconds, peak = measure(lambda: tokenize(jack_files), repeat)
+            source_bytes = sum(os.path.getsize(path) for path in jack_files)
+            results.append({
+                "workload": name, "size": size, "stage": "JackTokenizer",
+                "seconds": seconds, "peak_bytes": peak, "tokens": tokens,
+                "source_bytes": source_bytes,
+            })
+            log(f"{name:14} JackTokenizer        {seconds:8.3f}s  {peak / 1e6:7.1f} MB  {tokens} tokens")
+
+    return results
+
+# ==========================================
+# Checks
+# ==========================================
+
+def inlined_sites(directory, *options):
+    """
+    Translates a directory with the inliner on. Returns the number of
+    call sites the translator reports.
+    """
+    output = subprocess.run([sys.executable, VM_TRANSLATOR, directory, "-i", *options],
+                            capture_output=True, text=True, check=True).stdout
+    match = re.search(r"Inliner: (\d+) call sites inlined", output)
+    return int(match.group(1)) if match else None
+
+def check_inline_counts(log=print):
+    """
+    The inliner's report must not depend on how the fragments were made:
+    in this process, in worker processes, or loaded from the cache.
+    Returns the number of failed checks.
+    """
+    size = 8
+    with tempfile.TemporaryDirectory() as directory:
+        workload_dir = os.path.join(directory, "leaf_calls")
+        os.makedirs(workload_dir)
+        leaf_calls(workload_dir, size)
+        cache_dir = os.path.join(directory, "cache")
+        runs = {
+            "no cache": inlined_sites(workload_dir, "--no-cache"),
+            "-j 1": inlined_sites(workload_dir, "-j", "1", "--cache-dir", cache_dir),
+            "cache hit": inlined_sites(workload_dir, "-j", "1", "--cache-dir", cache_dir),
+            "-j 4": inlined_sites(workload_dir, "-j", "4", "--no-cache"),
+        }
+
+    failures = 0
+    for name, sites in runs.items():
+        ok = sites == 2 * size
+        failures += not ok
+        log(f"Inliner sites {name:10} {sites}  {'ok' if ok else f'expected {2 * size}'}")
+    return failures
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+# ==========================================
+# Comparison
+# ==========================================
+
+def compare(baseline, results, threshold, log=print):
+    """
+    Compares results with an earlier run. A stage is a regression when it
+    got slower by more than threshold (a fraction) or when it generates
+    more instructions. Returns the number of regressions.
+    """
+    previous = {(r["workload"], r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = 0
+    log(f"\nCompared with {baseline.get('revision') or 'baseline'}:")
+    for result in results:
+        old = previous.get((result["workload"], result["size"], result["stage"]))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else 1.0
+        notes = []
+        if ratio > 1 + threshold:
+            notes.append("SLOWER")
+        if result.get("instructions", 0) > old.get("instructions", 0):
+            notes.append("MORE CODE")
+        regressions += bool(notes)
+        size_change = ""
+        if "instructions" in result:
+            size_change = f"  instructions {old['instructions']} -> {result['instructions']}"
+        log(f"   {result['workload']:14} {result['stage']:20} time x{ratio:.2f}{size_change}"
+            f"  {' '.join(notes)}")
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python Benchmark.py [options]",
+        description="Times Parser, CodeWriter and JackTokenizer on synthetic workloads "
+                    "and writes the results as JSON."
+    )
+    arg_parser.add_argument("-s", "--scale", type=float, default=1.0,
+                            help="multiply every workload size by this factor")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=3,
+                            help="runs per stage; the best time is kept")
+    arg_parser.add_argument("-o", "--output", default="benchmark.json",
+                            help="where to write the JSON results")
+    arg_parser.add_argument("--compare", metavar="BASELINE_JSON",
+                            help="report regressions against an earlier results file")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="only check that the translator reports the same inlined "
+                                 "call sites however the fragments were made")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="slowdown counted as a regression with --compare (default 0.10)")
+    args = arg_parser.parse_args()
+
+    if args.check:
+        if check_inline_counts():
+            print("❌ Error: the inlined call site counts differ")
+            sys.exit(1)
+        print("✅ Checks passed")
+        return
+
+    results = run_benchmarks(args.scale, args.repeat)
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+
+# Synthetic inputs for the benchmarks. Each generator writes its files
+# into a directory and returns their paths; size scales the workload.
+
+def call_chain(directory, size):
+    """
+    One .vm file where Sys.init starts a chain of size nested calls,
+    each function passing its argument on to the next one.
+    """
+    lines = [
+        "function Sys.init 0",
+        "push constant 1",
+        "call Chain.f0 1",
+        "pop temp 0",
+        "label HALT",
+        "goto HALT",
+    ]
+    for i in range(size):
+        lines += [
+            f"function Chain.f{i} 1",
+            "push argument 0",
+            "push constant 1",
+            "add",
+            "pop local 0",
+        ]
+        if i + 1 < size:
+            lines += ["push local 0", f"call Chain.f{i + 1} 1"]
+        else:
+            lines += ["push local 0"]
+        lines += ["return"]
+    return [_write(directory, "Chain.vm", lines)]
+
+def compare_loops(directory, size):
+    """
+    One .vm file with size loops whose bodies are mostly eq/gt/lt tests.
+    """
+    lines = ["function Sys.init 2"]
+    for i in range(size):
+        lines += [
+            "push constant 0",
+            "pop local 0",
+            f"label LOOP{i}",
+            "push local 0",
+            "push constant 10",
+            "lt",
+            "push local 0",
+            "push constant 3",
+            "gt",
+            "and",
+            "push local 0",
+            "push constant 5",
+            "eq",
+            "or",
+            "pop local 1",
+            "push local 0",
+            "push constant 1",
+            "add",
+            "pop local 0",
+            "push local 0",
+            "push constant 10",
+            "lt",
+            f"if-goto LOOP{i}",
+        ]
+    lines += ["label HALT", "goto HALT"]
+    return [_write(directory, "Sys.vm", lines)]
+
+def many_statics(directory, size):
+    """
+    size .vm files, each with a function that moves values between eight
+    statics, plus a Sys.init that calls all of them.
+    """
+    paths = []
+    init = ["function Sys.init 0"]
+    for i in range(size):
+        name = f"Static{i}"
+        lines = [f"function {name}.run 0"]
+        for j in range(8):
+            lines += [f"push constant {i + j}", f"pop static {j}"]
+        for j in range(7):
+            lines += [f"push static {j}", f"push static {j + 1}", "add", f"pop static {j}"]
+        lines += ["push static 0", "return"]
+        paths.append(_write(directory, f"{name}.vm", lines))
+        init += [f"call {name}.run 0", "pop temp 0"]
+    init += ["label HALT", "goto HALT"]
+    paths.append(_write(directory, "Sys.vm", init))
+    return paths
+
+def leaf_calls(directory, size):
+    """
+    size .vm files, each calling the leaf function Leaf.twice twice (two
+    call sites for the inliner per file), plus a Sys.init that calls them.
+    """
+    paths = [_write(directory, "Leaf.vm", [
+        "function Leaf.twice 0",
+        "push argument 0",
+        "push argument 0",
+        "add",
+        "return",
+    ])]
+    init = ["function Sys.init 0"]
+    for i in range(size):
+        name = f"Caller{i}"
+        paths.append(_write(directory, f"{name}.vm", [
+            f"function {name}.run 0",
+            f"push constant {i}",
+            "call Leaf.twice 1",
+            "call Leaf.twice 1",
+            "return",
+        ]))
+        init += [f"call {name}.run 0", "pop temp 0"]
+    init += ["label HALT", "goto HALT"]
+    paths.append(_write(directory, "Sys.vm", init))
+    return paths
+
+def jack_source(directory, size):
+    """
+    One .jack class of size methods, each with a long block comment,
+    line comments and long string constants.
+    """
+    comment = " ".join(["lorem ipsum dolor sit amet"] * 8)
+    text = " ".join(["The quick brown fox jumps over the lazy dog"] * 4)
+    lines = [
+        "/** Generated benchmark class. */",
+        "class Big {",
+        "    field int x, y;",
+        "    static String name;",
+    ]
+    for i in range(size):
+        lines += [
+            "    /**",
+            f"     * Method {i}: {comment}",
+            f"     * {comment}",
+            "     */",
+            f"    method int m{i}(int a, int b) {{",
+            "        var int i, sum;",
+            "        var String s;",
+            f'        let s = "{text} {i}";  // {comment}',
+            "        let i = 0;",
+            "        let sum = 0;",
+            "        while (i < a) {",
+            "            let sum = sum + (b * i) - (x / 2);",
+            "            if (~(sum = 0) & (i > 3)) {",
+            f'                do Output.printString("{text}");',
+            "            }",
+            "            let i = i + 1;",
+            "        }",
+            "        return sum;",
+            "    }",
+        ]
+    lines += ["}"]
+    return [_write(directory, "Big.jack", lines)]
+
+VM_WORKLOADS = {
+    "call_chain": call_chain,
+    "compare_loops": compare_loops,
+    "many_statics": many_statics,
+}
+
+JACK_WORKLOADS = {
+    "jack_source": jack_source,
+}
+
+def _write(directory, file_name, lines):
+    path = os.path.join(directory, file_name)
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
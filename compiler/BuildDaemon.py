@@ -0,0 +1,414 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import socketserver
+from collections import namedtuple
+import TranslatorPath
+from JackTokenizer import JackTokenizer, scan
+from CompilationEngine import CompilationEngine
+from VMWriter import VMWriter
+from CodeWriter import CodeWriter
+from PeepholeOptimizer import PeepholeOptimizer
+from Parser import read_commands
+from ParallelTranslator import translate_commands
+from HackAssembler import Fragment, link
+
+# What a build does: the compiler's -J and -S, and the VM translator's
+# -O, -V, -c and -t
+BuildOptions = namedtuple("BuildOptions",
+                          ["optimize_jack", "pool_strings", "optimize", "vm_optimize",
+                           "compact", "cache_top"],
+                          defaults=[False] * 6)
+
+# Seconds between two looks at the project in watch mode
+DEFAULT_INTERVAL = 0.25
+
+# Name of the daemon's socket in the project directory
+SOCKET_NAME = ".build.sock"
+
+class SourceFile:
+    """
+    What the daemon keeps of one .jack (or source-less .vm) file: how it
+    was last seen, its tokens, and the output of each later stage with the
+    key it was made for: (key, Commands) and (key,
+    HackAssembler Fragment). A stage is redone only when its key changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.is_jack = path.endswith(".jack")
+        self.signature = None
+        self.digest = None
+        self.text = None
+        self.tokens = None
+        self.commands = (None, None)
+        self.fragment = (None, None)
+
+    def refresh(self):
+        """
+        Returns True if the content changed since the last call. The mtime
+        and size are checked first; when they differ the content is hashed,
+        so a file that was only touched is not rebuilt.
+        """
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        self.text = content.decode()
+        self.tokens = None
+        return True
+
+class BuildDaemon:
+    """
+    Builds a Jack project (its .jack files, plus the .vm files that have
+    no .jack source, such as the OS) into a .hack file, and stays in
+    memory between builds: each file's tokens, VM commands and assembled
+    fragment are kept, and a build only redoes the stages of the files
+    that changed (or whose options did) before linking the fragments
+    (HackAssembler.link). Builds are requested over a Unix socket, or
+    run whenever a file changes in watch mode.
+    """
+
+    def __init__(self, project_dir, output_file=None, options=BuildOptions(), log=print):
+        self.project_dir = project_dir
+        dir_name = os.path.basename(os.path.normpath(project_dir))
+        self.output_file = output_file or os.path.join(project_dir, dir_name + ".hack")
+        self.options = options
+        # What the last requested build used: watch mode rebuilds with it
+        self.last_options = options
+        self.log = log
+        self.sources = {}
+        self.order = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.builds = 0
+        # Fragments of the last program written, to skip unchanged builds
+        self.linked = None
+        self.instructions = 0
+        # (translator options, Fragment) of the bootstrap code
+        self.bootstrap = (None, None)
+
+    # ------------------------------------------
+    # Builds
+    # ------------------------------------------
+
+    def scan_sources(self):
+        """
+        Brings the sources up to date with the project directory. Returns
+        the names of the files added, changed or removed.
+        """
+        names = sorted(os.listdir(self.project_dir))
+        classes = {name[:-len(".jack")] for name in names if name.endswith(".jack")}
+        paths = [os.path.join(self.project_dir, name) for name in names if name.endswith(".jack")]
+        paths += [
+            os.path.join(self.project_dir, name) for name in names
+            if name.endswith(".vm") and name[:-len(".vm")] not in classes
+        ]
+
+        changed = [os.path.basename(path) for path in self.sources if path not in paths]
+        self.sources = {path: self.sources.get(path) or SourceFile(path) for path in paths}
+        for path, source in self.sources.items():
+            if source.refresh():
+                changed.append(os.path.basename(path))
+        self.order = paths
+        return changed
+
+    def build(self, options=None):
+        """
+        Builds the project and writes the .hack file if the program
+        changed. Returns a report: ok, changed files, how many files each
+        stage was redone for, instructions and milliseconds (or error).
+        """
+        options = options or self.options
+        with self.lock:
+            start = time.perf_counter()
+            stages = {"tokenized": 0, "compiled": 0, "translated": 0}
+            report = {"ok": True, "changed": [], "stages": stages, "linked": False}
+            try:
+                report["changed"] = self.scan_sources()
+                fragments = [self._fragment(self.sources[path], options, stages)
+                             for path in self.order]
+            except (OSError, ValueError) as error:
+                report.update(ok=False, error=str(error))
+                report["milliseconds"] = round((time.perf_counter() - start) * 1000, 2)
+                return report
+
+            fragments.insert(0, self._bootstrap(options))
+            up_to_date = (self.linked is not None and len(fragments) == len(self.linked)
+                          and all(a is b for a, b in zip(fragments, self.linked))
+                          and os.path.exists(self.output_file))
+            if not up_to_date:
+                lines = link(fragments)
+                with open(self.output_file, 'w') as f:
+                    f.write("\n".join(lines) + "\n")
+                self.linked = fragments
+                self.instructions = len(lines)
+                report["linked"] = True
+
+            self.builds += 1
+            report["output"] = self.output_file
+            report["instructions"] = self.instructions
+            report["milliseconds"] = round((time.perf_counter() - start) * 1000, 2)
+            return report
+
+    def _bootstrap(self, options):
+        """
+        SP = 256, call Sys.init and, in compact mode, the shared runtime,
+        as the VM translator writes them with the same options.
+        """
+        key = (options.optimize, options.compact, options.cache_top)
+        if self.bootstrap[0] != key:
+            buffer = io.StringIO()
+            optimizer = PeepholeOptimizer() if options.optimize else None
+            code_writer = CodeWriter(buffer, optimizer, compact=options.compact,
+                                     cache_top=options.cache_top)
+            code_writer.write_init()
+            code_writer.close()
+            self.bootstrap = (key, Fragment(buffer.getvalue()))
+        return self.bootstrap[1]
+
+    def _fragment(self, source, options, stages):
+        """
+        The first-passed assembly of one file, redoing only the stages
+        whose key changed.
+        """
+        if source.is_jack:
+            commands_key = (source.digest, options.optimize_jack, options.pool_strings)
+        else:
+            commands_key = (source.digest,)
+        key, commands = source.commands
+        if key != commands_key:
+            commands = self._commands(source, options, stages)
+            source.commands = (commands_key, commands)
+
+        fragment_key = (commands_key, options.optimize, options.vm_optimize,
+                        options.compact, options.cache_top)
+        key, fragment = source.fragment
+        if key != fragment_key:
+            assembly = translate_commands(commands, source.name, options.optimize,
+                                          options.compact, options.vm_optimize,
+                                          options.cache_top)[0]
+            fragment = Fragment(assembly)
+            source.fragment = (fragment_key, fragment)
+            stages["translated"] += 1
+        return fragment
+
+    def _commands(self, source, options, stages):
+        if not source.is_jack:
+            commands = list(read_commands(source.text.splitlines()))
+            source.text = None
+            stages["compiled"] += 1
+            return commands
+
+        if source.tokens is None:
+            source.tokens = list(scan(source.text))
+            source.text = None
+            stages["tokenized"] += 1
+        commands = []
+        tokenizer = JackTokenizer.from_records(source.tokens)
+        try:
+            CompilationEngine(tokenizer, VMWriter(commands.append), options.optimize_jack,
+                              options.pool_strings).compile_class()
+        except ValueError as error:
+            raise ValueError(f"{source.name}.jack: {error}") from None
+        stages["compiled"] += 1
+        return commands
+
+    # ------------------------------------------
+    # Requests
+    # ------------------------------------------
+
+    def handle(self, request):
+        """
+        Answers one request: {"command": "build", "options": {...}} (each
+        option true or false; those not given are the daemon's), "status"
+        or "stop". The options of a build stay in use for the rebuilds of
+        watch mode, until the next build request.
+        """
+        command = request.get("command")
+        if command == "build":
+            overrides = request.get("options", {})
+            try:
+                if not all(isinstance(value, bool) for value in overrides.values()):
+                    raise ValueError("options are true or false")
+                options = self.options._replace(**overrides)
+            except (AttributeError, TypeError, ValueError) as error:
+                return {"ok": False, "error": f"bad options: {error}"}
+            self.last_options = options
+            report = self.build(options)
+            self.log(format_report(report))
+            return report
+        if command == "status":
+            return {"ok": True, "project": self.project_dir, "output": self.output_file,
+                    "files": len(self.sources), "builds": self.builds,
+                    "options": self.options._asdict(),
+                    "last_options": self.last_options._asdict()}
+        if command == "stop":
+            if self.server:
+                threading.Thread(target=self.server.shutdown).start()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command: {command}"}
+
+    def watch(self, interval=DEFAULT_INTERVAL):
+        """
+        Rebuilds whenever a file of the project changes, until stopped,
+        with the options of the last build request. Logs the ticks that
+        found changes or wrote the .hack file.
+        """
+        while True:
+            time.sleep(interval)
+            report = self.build(self.last_options)
+            if report["changed"] or report["linked"]:
+                self.log(format_report(report))
+
+    def serve(self, socket_path, watch=False, interval=DEFAULT_INTERVAL):
+        """
+        Builds once, then serves requests on socket_path (and watches the
+        project if asked) until a stop request or Ctrl+C.
+        """
+        _remove_stale_socket(socket_path)
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, _RequestHandler)
+        self.server.daemon_threads = True
+        self.server.builder = self
+        self.log(format_report(self.build()))
+        if watch:
+            threading.Thread(target=self.watch, args=(interval,), daemon=True).start()
+        self.log(f"Listening on {socket_path}" + (" (watching for changes)" if watch else ""))
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            os.unlink(socket_path)
+            self.log("Stopped.")
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON request per line, answered with one JSON line.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.builder.handle(json.loads(line))
+            except ValueError as error:
+                response = {"ok": False, "error": f"bad request: {error}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+def _remove_stale_socket(socket_path):
+    """
+    Removes the socket of a daemon that is gone; fails if one still runs.
+    """
+    if not os.path.exists(socket_path):
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(socket_path)
+        return
+    raise OSError(f"a build daemon is already listening on {socket_path}")
+
+def send_request(socket_path, request):
+    """
+    Sends one request to a running daemon and returns its answer.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile('r') as answer:
+            return json.loads(answer.readline())
+
+def format_report(report):
+    if not report["ok"]:
+        return f"❌ Error: {report['error']}"
+    stages = report["stages"]
+    changed = ", ".join(report["changed"]) or "nothing"
+    state = "Built" if report["linked"] else "Up to date:"
+    return (f"{state} {report['output']}: {report['instructions']} instructions in "
+            f"{report['milliseconds']} ms (changed: {changed}; tokenized {stages['tokenized']}, "
+            f"compiled {stages['compiled']}, translated {stages['translated']})")
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(
+        usage="python BuildDaemon.py <project directory> [options]",
+        description="Keeps a Jack project built into a .hack file from a long-running process "
+                    "that remembers every stage of every file, so a rebuild only redoes what "
+                    "changed. With --request, talks to the daemon of the project instead."
+    )
+    arg_parser.add_argument("project_dir", help="a directory of .jack (and .vm) files")
+    arg_parser.add_argument("-o", "--output", help="output .hack file (default: Xxx.hack in it)")
+    arg_parser.add_argument("--socket",
+                            help=f"Unix socket of the daemon (default: {SOCKET_NAME} in the project)")
+    arg_parser.add_argument("-w", "--watch", action="store_true",
+                            help="also rebuild whenever a file of the project changes")
+    arg_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                            help="watch mode: seconds between two looks at the files")
+    arg_parser.add_argument("--request", choices=["build", "status", "stop"],
+                            help="send a request to the running daemon and print the answer")
+    # Each option can be turned on (-J) or off (--no-optimize-jack): with
+    # --request, those not given keep the daemon's setting
+    switch = argparse.BooleanOptionalAction
+    arg_parser.add_argument("-J", "--optimize-jack", action=switch,
+                            help="fold constants and reduce multiplications (see Main.py)")
+    arg_parser.add_argument("-S", "--pool-strings", action=switch,
+                            help="build each string literal once (see Main.py)")
+    arg_parser.add_argument("-O", "--optimize", action=switch,
+                            help="run the peephole optimizer over the assembly")
+    arg_parser.add_argument("-V", "--vm-optimize", action=switch,
+                            help="fold constants and fuse VM command sequences")
+    arg_parser.add_argument("-c", "--compact", action=switch,
+                            help="use shared call/return/compare subroutines to save ROM")
+    arg_parser.add_argument("-t", "--cache-top", action=switch,
+                            help="keep the top of the stack in the D register between commands")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.project_dir):
+        print(f"❌ Error: '{args.project_dir}' is not a directory.")
+        sys.exit(1)
+    socket_path = args.socket or os.path.join(args.project_dir, SOCKET_NAME)
+    given = {name: getattr(args, name) for name in BuildOptions._fields
+             if getattr(args, name) is not None}
+
+    if args.request:
+        request = {"command": args.request}
+        if args.request == "build":
+            # The options given are set for this build only
+            request["options"] = given
+        try:
+            answer = send_request(socket_path, request)
+        except OSError as error:
+            print(f"❌ Error: no build daemon on {socket_path} ({error})")
+            sys.exit(1)
+        if args.request == "build":
+            print(format_report(answer))
+        else:
+            print(json.dumps(answer, indent=2))
+        sys.exit(0 if answer.get("ok") else 1)
+
+    daemon = BuildDaemon(args.project_dir, args.output, BuildOptions(**given))
+    try:
+        daemon.serve(socket_path, args.watch, args.interval)
+    except OSError as error:
+        print(f"❌ Error: {error}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,661 @@
+from Constants import *
+from SymbolTable import SymbolTable, SEGMENTS, STATIC, FIELD, ARG, VAR
+from VMWriter import VMWriter, CommandType
+
+BINARY_OPERATORS = {
+    "+": "add",
+    "-": "sub",
+    "&": "and",
+    "|": "or",
+    "<": "lt",
+    ">": "gt",
+    "=": "eq",
+}
+
+# Operators the Hack platform has no instruction for
+OS_OPERATORS = {
+    "*": "Math.multiply",
+    "/": "Math.divide",
+}
+
+UNARY_OPERATORS = {
+    "-": "neg",
+    "~": "not",
+}
+
+# Operators whose constant operand can be moved to the right
+COMMUTATIVE = {"+", "*", "&", "|", "="}
+
+STATEMENTS = {"let", "if", "while", "do", "return"}
+
+# Function of each class that builds its pooled string literals: a legal
+# VM (and Jack) name, so other VM tools accept the output
+STRING_POOL_FUNCTION = "initStrings__"
+
+# Largest integer constant a Jack program may write
+MAX_INT = 32767
+MIN_INT = -32768
+
+# Condition tails the optimizer rewrites, as (type, arg1, arg2)
+PUSH_ZERO = (CommandType.PUSH, "constant", 0)
+EQ = (CommandType.ARITHMETIC, "eq", None)
+NOT = (CommandType.ARITHMETIC, "not", None)
+
+def to_word(value):
+    """
+    value wrapped around to a signed 16-bit int, as the Hack ALU computes it.
+    """
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+def fold(operator, x, y):
+    """
+    The value of the constant expression x operator y, or None when it is
+    left to run time (a division by zero, which the OS reports).
+    Division truncates toward zero, like Math.divide.
+    """
+    if operator == "+":
+        return to_word(x + y)
+    if operator == "-":
+        return to_word(x - y)
+    if operator == "*":
+        return to_word(x * y)
+    if operator == "/":
+        if y == 0:
+            return None
+        quotient = abs(x) // abs(y)
+        return to_word(-quotient if (x < 0) != (y < 0) else quotient)
+    if operator == "&":
+        return x & y
+    if operator == "|":
+        return x | y
+    # Comparisons test the sign of the wrapped-around x - y, as the Hack
+    # code of lt and gt does (and VMOptimizer folds them)
+    if operator == "<":
+        return -1 if to_word(x - y) < 0 else 0
+    if operator == ">":
+        return -1 if to_word(x - y) > 0 else 0
+    return -1 if x == y else 0
+
+class CompilationEngine:
+    """
+    Single-pass recursive-descent compiler of one Jack class. It reads
+    the JackTokenizer stream (one token of lookahead, through peek) and
+    writes VM commands through the VMWriter as each construct is
+    recognized: there is no parse tree and no XML in between.
+    Syntax errors raise ValueError with the line and column of the token.
+
+    optimize computes constant expressions at compile time, multiplies by
+    powers of two with additions instead of Math.multiply, drops operations
+    that leave a value unchanged, and writes shorter branches for if/while
+    conditions such as ~(x = 0). To see past a constant operand, the code
+    of the next term is collected first and written once it is known.
+
+    pool_strings gives every distinct string literal of the class a static
+    slot, after the declared statics. Xxx.initStrings__, written at the end
+    of the class, builds them all the first time any of them is used (the
+    OS heap is only there once Sys.init has run), and each use then pushes
+    its slot instead of building a new String. The literals are shared, so
+    a program must not change or dispose of them, nor declare a subroutine
+    of that name.
+    """
+
+    def __init__(self, tokenizer, writer, optimize=False, pool_strings=False):
+        self.tokenizer = tokenizer
+        self.writer = writer
+        self.optimize = optimize
+        self.pool_strings = pool_strings
+        # Pooled literal -> its static index
+        self.strings = {}
+        self.symbols = SymbolTable()
+        self.class_name = None
+        self.function_name = None
+        self.label_count = 0
+        # Current token: (type, value, line, column), type None at the end
+        self.token = None
+        self._advance()
+
+    # ------------------------------------------
+    # Tokens
+    # ------------------------------------------
+
+    def _advance(self):
+        if self.tokenizer.has_more_tokens():
+            self.tokenizer.advance()
+            self.token = self.tokenizer.current
+        else:
+            line, column = (self.token[2], self.token[3]) if self.token else (1, 1)
+            self.token = (None, None, line, column)
+
+    def _error(self, expected):
+        token_type, value, line, column = self.token
+        found = "the end of the file" if token_type is None else f"'{value}'"
+        raise ValueError(f"line {line}, column {column}: expected {expected}, found {found}")
+
+    def _is(self, token_type, *values):
+        return self.token[0] == token_type and (not values or self.token[1] in values)
+
+    def _symbol(self, value):
+        if not self._is(SYMBOL, value):
+            self._error(f"'{value}'")
+        self._advance()
+
+    def _keyword(self, *values):
+        if not self._is(KEYWORD, *values):
+            self._error(" or ".join(f"'{value}'" for value in values))
+        value = self.token[1]
+        self._advance()
+        return value
+
+    def _identifier(self):
+        if not self._is(IDENTIFIER):
+            self._error("an identifier")
+        value = self.token[1]
+        self._advance()
+        return value
+
+    def _type(self):
+        if self._is(KEYWORD, "int", "char", "boolean"):
+            return self._keyword("int", "char", "boolean")
+        return self._identifier()
+
+    def _new_label(self, kind):
+        # Prefixed by the function: CodeWriter does not scope labels. ':' is
+        # legal in VM labels and cannot appear in a Jack name
+        label = f"{self.function_name}:{kind}{self.label_count}"
+        self.label_count += 1
+        return label
+
+    def _capture(self, compile):
+        """
+        Runs compile() with what it writes collected in a list instead.
+        Returns its result and the Commands.
+        """
+        writer = self.writer
+        commands = []
+        self.writer = VMWriter(commands.append)
+        try:
+            result = compile()
+        finally:
+            self.writer = writer
+        return result, commands
+
+    def _replay(self, commands):
+        for command in commands:
+            self.writer.write_command(command)
+
+    def _variable(self, name):
+        symbol = self.symbols.lookup(name)
+        if symbol is None:
+            line, column = self.token[2], self.token[3]
+            raise ValueError(f"line {line}, column {column}: undefined variable '{name}'")
+        return SEGMENTS[symbol.kind], symbol.index
+
+    # ------------------------------------------
+    # Program structure
+    # ------------------------------------------
+
+    def compile_class(self):
+        self._keyword("class")
+        self.class_name = self._identifier()
+        self._symbol("{")
+        while self._is(KEYWORD, "static", "field"):
+            self.compile_class_var_dec()
+        while self._is(KEYWORD, "constructor", "function", "method"):
+            self.compile_subroutine()
+        self._symbol("}")
+        if self.token[0] is not None:
+            self._error("the end of the class")
+        if self.strings:
+            self._write_string_pool()
+
+    def _write_string_pool(self):
+        writer = self.writer
+        writer.write_function(f"{self.class_name}.{STRING_POOL_FUNCTION}", 0)
+        for literal, index in self.strings.items():
+            self._write_string(literal)
+            writer.write_pop("static", index)
+        writer.write_push("constant", 0)
+        writer.write_return()
+
+    def compile_class_var_dec(self):
+        kind = STATIC if self._keyword("static", "field") == "static" else FIELD
+        var_type = self._type()
+        self.symbols.define(self._identifier(), var_type, kind)
+        while self._is(SYMBOL, ","):
+            self._advance()
+            self.symbols.define(self._identifier(), var_type, kind)
+        self._symbol(";")
+
+    def compile_subroutine(self):
+        kind = self._keyword("constructor", "function", "method")
+        if self._is(KEYWORD, "void"):
+            self._advance()
+        else:
+            self._type()
+        line, column = self.token[2], self.token[3]
+        name = self._identifier()
+        if self.pool_strings and name == STRING_POOL_FUNCTION:
+            raise ValueError(f"line {line}, column {column}: '{name}' is reserved for "
+                             f"the string pool")
+        self.function_name = f"{self.class_name}.{name}"
+        self.label_count = 0
+        self.symbols.start_subroutine()
+        if kind == "method":
+            self.symbols.define("this", self.class_name, ARG)
+
+        self._symbol("(")
+        self.compile_parameter_list()
+        self._symbol(")")
+        self.compile_subroutine_body(kind)
+
+    def compile_parameter_list(self):
+        while not self._is(SYMBOL, ")"):
+            var_type = self._type()
+            self.symbols.define(self._identifier(), var_type, ARG)
+            if not self._is(SYMBOL, ","):
+                break
+            self._advance()
+
+    def compile_subroutine_body(self, kind):
+        self._symbol("{")
+        while self._is(KEYWORD, "var"):
+            self.compile_var_dec()
+
+        # The locals are all known now: the function command can be written
+        writer = self.writer
+        writer.write_function(self.function_name, self.symbols.var_count(VAR))
+        if kind == "constructor":
+            writer.write_push("constant", self.symbols.var_count(FIELD))
+            writer.write_call("Memory.alloc", 1)
+            writer.write_pop("pointer", 0)
+        elif kind == "method":
+            writer.write_push("argument", 0)
+            writer.write_pop("pointer", 0)
+
+        self.compile_statements()
+        self._symbol("}")
+
+    def compile_var_dec(self):
+        self._keyword("var")
+        var_type = self._type()
+        self.symbols.define(self._identifier(), var_type, VAR)
+        while self._is(SYMBOL, ","):
+            self._advance()
+            self.symbols.define(self._identifier(), var_type, VAR)
+        self._symbol(";")
+
+    # ------------------------------------------
+    # Statements
+    # ------------------------------------------
+
+    def compile_statements(self):
+        while self._is(KEYWORD, *STATEMENTS):
+            statement = self.token[1]
+            if statement == "let":
+                self.compile_let()
+            elif statement == "if":
+                self.compile_if()
+            elif statement == "while":
+                self.compile_while()
+            elif statement == "do":
+                self.compile_do()
+            else:
+                self.compile_return()
+
+    def compile_let(self):
+        writer = self.writer
+        self._keyword("let")
+        segment, index = self._variable(self.token[1])
+        self._identifier()
+
+        if self._is(SYMBOL, "["):
+            # Address first; the value goes through temp 0 since computing
+            # it may use pointer 1 itself
+            self._advance()
+            writer.write_push(segment, index)
+            self.compile_expression()
+            self._symbol("]")
+            writer.write_arithmetic("add")
+            self._symbol("=")
+            self.compile_expression()
+            self._symbol(";")
+            writer.write_pop("temp", 0)
+            writer.write_pop("pointer", 1)
+            writer.write_push("temp", 0)
+            writer.write_pop("that", 0)
+            return
+
+        self._symbol("=")
+        self.compile_expression()
+        self._symbol(";")
+        writer.write_pop(segment, index)
+
+    def compile_if(self):
+        writer = self.writer
+        self._keyword("if")
+        self._symbol("(")
+        else_label = self._new_label("IF_ELSE")
+        self._jump_unless(else_label)
+        self._symbol(")")
+        self._block()
+
+        if self._is(KEYWORD, "else"):
+            self._advance()
+            end_label = self._new_label("IF_END")
+            writer.write_goto(end_label)
+            writer.write_label(else_label)
+            self._block()
+            writer.write_label(end_label)
+        else:
+            writer.write_label(else_label)
+
+    def compile_while(self):
+        writer = self.writer
+        self._keyword("while")
+        loop_label = self._new_label("WHILE")
+        end_label = self._new_label("WHILE_END")
+        writer.write_label(loop_label)
+        self._symbol("(")
+        self._jump_unless(end_label)
+        self._symbol(")")
+        self._block()
+        writer.write_goto(loop_label)
+        writer.write_label(end_label)
+
+    def _jump_unless(self, label):
+        """
+        Compiles a condition and jumps to label when it is false, i.e. not
+        true (-1): condition, not, if-goto. With optimize:
+        a constant condition   -> goto label, or nothing
+        ~(E = 0)               -> E, push constant 0, eq, if-goto (no nots)
+        ~E                     -> E, if-goto (not, not cancel out)
+        E = 0                  -> E, if-goto
+        """
+        writer = self.writer
+        if not self.optimize:
+            self.compile_expression()
+            writer.write_arithmetic("not")
+            writer.write_if(label)
+            return
+
+        value, code = self._capture(self._expression)
+        if value is not None:
+            if value != -1:
+                writer.write_goto(label)
+            return
+        tail = [command[:3] for command in code[-3:]]
+        if tail[-1:] == [NOT]:
+            self._replay(code[:-1])
+        elif tail[-2:] == [PUSH_ZERO, EQ]:
+            self._replay(code[:-2])
+        else:
+            self._replay(code)
+            writer.write_arithmetic("not")
+        writer.write_if(label)
+
+    def _block(self):
+        self._symbol("{")
+        self.compile_statements()
+        self._symbol("}")
+
+    def compile_do(self):
+        self._keyword("do")
+        name = self._identifier()
+        self.compile_subroutine_call(name)
+        self._symbol(";")
+        # The return value of a do is dropped
+        self.writer.write_pop("temp", 0)
+
+    def compile_return(self):
+        self._keyword("return")
+        if self._is(SYMBOL, ";"):
+            self.writer.write_push("constant", 0)
+        else:
+            self.compile_expression()
+        self._symbol(";")
+        self.writer.write_return()
+
+    # ------------------------------------------
+    # Expressions
+    # ------------------------------------------
+
+    def compile_expression(self):
+        """
+        term (op term)*, evaluated left to right: Jack has no precedence.
+        """
+        value = self._expression()
+        if value is not None:
+            self._push_value(value)
+
+    def _expression(self):
+        """
+        Compiles an expression. With optimize, one whose value is known at
+        compile time writes nothing: the value is returned, else None.
+        """
+        left = self.compile_term()
+        while self.token[0] == SYMBOL and (self.token[1] in BINARY_OPERATORS
+                                           or self.token[1] in OS_OPERATORS):
+            operator = self.token[1]
+            self._advance()
+            if left is None:
+                right = self.compile_term()
+                if right is None:
+                    self._write_operator(operator)
+                else:
+                    self._write_operator_constant(operator, right)
+                continue
+
+            # The left operand is a constant not written yet
+            right, code = self._capture(self.compile_term)
+            if right is not None:
+                value = fold(operator, left, right)
+                if value is not None:
+                    left = value
+                    continue
+                self._push_value(left)
+                self._push_value(right)
+                self._write_operator(operator)
+            elif operator in COMMUTATIVE:
+                self._replay(code)
+                self._write_operator_constant(operator, left)
+            else:
+                self._push_value(left)
+                self._replay(code)
+                self._write_operator(operator)
+            left = None
+        return left
+
+    def _push_value(self, value):
+        """
+        Pushes any signed 16-bit value: push constant only takes 0..32767,
+        and ~value is in that range for a negative one.
+        """
+        if value >= 0:
+            self.writer.write_push("constant", value)
+        else:
+            self.writer.write_push("constant", ~value)
+            self.writer.write_arithmetic("not")
+
+    def _write_operator(self, operator):
+        if operator in OS_OPERATORS:
+            self.writer.write_call(OS_OPERATORS[operator], 2)
+        else:
+            self.writer.write_arithmetic(BINARY_OPERATORS[operator])
+
+    def _write_operator_constant(self, operator, value):
+        """
+        Applies operator to the value on the stack and a constant, with the
+        shortest VM code that gives the same result.
+        """
+        writer = self.writer
+        if ((operator in ("+", "-", "|") and value == 0)
+                or (operator in ("*", "/") and value == 1)
+                or (operator == "&" and value == -1)):
+            return
+        if (operator in ("*", "&") and value == 0) or (operator == "|" and value == -1):
+            # The result is the constant; the operand is still computed for
+            # any calls it makes
+            writer.write_pop("temp", 0)
+            self._push_value(value)
+            return
+        if operator in ("*", "/") and value == -1:
+            writer.write_arithmetic("neg")
+            return
+        magnitude = abs(value)
+        if operator == "*" and magnitude & (magnitude - 1) == 0:
+            # x * 2^k: k doublings, x + x, through temp 0 since the VM has
+            # no dup
+            for _ in range(magnitude.bit_length() - 1):
+                writer.write_pop("temp", 0)
+                writer.write_push("temp", 0)
+                writer.write_push("temp", 0)
+                writer.write_arithmetic("add")
+            if value < 0:
+                writer.write_arithmetic("neg")
+            return
+        if operator in ("+", "-") and value < 0 and value != MIN_INT:
+            writer.write_push("constant", -value)
+            writer.write_arithmetic("sub" if operator == "+" else "add")
+            return
+        self._push_value(value)
+        self._write_operator(operator)
+
+    def _constant(self, value):
+        """
+        A constant term: returned as it is with optimize, else pushed.
+        """
+        if self.optimize:
+            return value
+        self._push_value(value)
+        return None
+
+    def compile_term(self):
+        """
+        Compiles a term. Returns its value if it is a constant that was not
+        written (see _expression), else None.
+        """
+        writer = self.writer
+        token_type, value = self.token[0], self.token[1]
+
+        if token_type == INT_CONST:
+            if int(value) > MAX_INT:
+                self._error(f"an integer constant of at most {MAX_INT}")
+            self._advance()
+            return self._constant(int(value))
+
+        elif token_type == STRING_CONST:
+            if self.pool_strings:
+                self._write_pooled_string(value)
+            else:
+                self._write_string(value)
+            self._advance()
+
+        elif token_type == KEYWORD and value in ("true", "false", "null", "this"):
+            self._advance()
+            if value == "this":
+                writer.write_push("pointer", 0)
+            else:
+                return self._constant(-1 if value == "true" else 0)
+
+        elif token_type == SYMBOL and value == "(":
+            self._advance()
+            constant = self._expression()
+            self._symbol(")")
+            return constant
+
+        elif token_type == SYMBOL and value in UNARY_OPERATORS:
+            self._advance()
+            constant = self.compile_term()
+            if constant is not None:
+                return to_word(-constant) if value == "-" else ~constant
+            writer.write_arithmetic(UNARY_OPERATORS[value])
+
+        elif token_type == IDENTIFIER:
+            following = self.tokenizer.peek(1)
+            following = following[1] if following and following[0] == SYMBOL else None
+            if following in ("(", "."):
+                self._advance()
+                self.compile_subroutine_call(value)
+            elif following == "[":
+                segment, index = self._variable(value)
+                self._advance()
+                self._advance()
+                writer.write_push(segment, index)
+                self.compile_expression()
+                self._symbol("]")
+                writer.write_arithmetic("add")
+                writer.write_pop("pointer", 1)
+                writer.write_push("that", 0)
+            else:
+                segment, index = self._variable(value)
+                self._advance()
+                writer.write_push(segment, index)
+
+        else:
+            self._error("a term")
+        return None
+
+    def _write_string(self, literal):
+        writer = self.writer
+        writer.write_push("constant", len(literal))
+        writer.write_call("String.new", 1)
+        for character in literal:
+            writer.write_push("constant", ord(character))
+            writer.write_call("String.appendChar", 2)
+
+    def _write_pooled_string(self, literal):
+        """
+        Pushes the literal's static slot, calling the pool function first
+        if the slot is still null.
+        """
+        writer = self.writer
+        index = self.strings.get(literal)
+        if index is None:
+            index = self.symbols.var_count(STATIC) + len(self.strings)
+            self.strings[literal] = index
+        built = self._new_label("STRING")
+        writer.write_push("static", index)
+        writer.write_if(built)
+        writer.write_call(f"{self.class_name}.{STRING_POOL_FUNCTION}", 0)
+        writer.write_pop("temp", 0)
+        writer.write_label(built)
+        writer.write_push("static", index)
+
+    def compile_subroutine_call(self, name):
+        """
+        Compiles the rest of a call whose first identifier was read:
+        f(...) is a method of this object, x.f(...) a method of the object
+        in variable x, and C.f(...) a function or constructor of class C.
+        """
+        total_args = 0
+        if self._is(SYMBOL, "."):
+            self._advance()
+            member = self._identifier()
+            symbol = self.symbols.lookup(name)
+            if symbol is not None:
+                self.writer.write_push(SEGMENTS[symbol.kind], symbol.index)
+                name = f"{symbol.type}.{member}"
+                total_args = 1
+            else:
+                name = f"{name}.{member}"
+        else:
+            self.writer.write_push("pointer", 0)
+            name = f"{self.class_name}.{name}"
+            total_args = 1
+
+        self._symbol("(")
+        total_args += self.compile_expression_list()
+        self._symbol(")")
+        self.writer.write_call(name, total_args)
+
+    def compile_expression_list(self):
+        if self._is(SYMBOL, ")"):
+            return 0
+        self.compile_expression()
+        count = 1
+        while self._is(SYMBOL, ","):
+            self._advance()
+            self.compile_expression()
+            count += 1
+        return count
@@ -1,16 +1,75 @@
 import sys
 import os
-from JackTokenizer import JackTokenizer
+import time
+from concurrent.futures import ProcessPoolExecutor
+from JackTokenizer import scan
 from Constants import *
 
+# The XML line of each token type, filled with the (escaped) token
+TEMPLATES = {
+    KEYWORD: "<keyword> %s </keyword>\n",
+    SYMBOL: "<symbol> %s </symbol>\n",
+    IDENTIFIER: "<identifier> %s </identifier>\n",
+    INT_CONST: "<integerConstant> %d </integerConstant>\n",
+    STRING_CONST: "<stringConstant> %s </stringConstant>\n",
+}
+
+# XML special characters, escaped in symbols and string constants
+XML_ESCAPES = str.maketrans({
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    '&': '&amp;',
+})
+
+# Complete lines of the keywords and symbols, escaped once
+KEYWORD_LINES = {keyword: TEMPLATES[KEYWORD] % keyword for keyword in KEYWORDS}
+SYMBOL_LINES = {symbol: TEMPLATES[SYMBOL] % symbol.translate(XML_ESCAPES)
+                for symbol in SYMBOLS}
+
+def analyze_file(input_file):
+    """
+    Writes the XxxT.xml token file of one .jack file: the tokens of the
+    whole file (JackTokenizer.scan) become a list of lines, which goes out
+    in a single write.
+    Returns (output file, tokens, seconds). Runs in the pool's workers.
+    """
+    start = time.perf_counter()
+    output_file = input_file.replace('.jack', 'T.xml')
+    with open(input_file, 'r') as f:
+        text = f.read()
+
+    lines = ['<tokens>\n']
+    append = lines.append
+    identifier = TEMPLATES[IDENTIFIER]
+    for token_type, value, _, _ in scan(text):
+        if token_type == IDENTIFIER:
+            append(identifier % value)
+        elif token_type == KEYWORD:
+            append(KEYWORD_LINES[value])
+        elif token_type == SYMBOL:
+            append(SYMBOL_LINES[value])
+        elif token_type == INT_CONST:
+            append(TEMPLATES[INT_CONST] % int(value))
+        else:
+            append(TEMPLATES[STRING_CONST] % value.translate(XML_ESCAPES))
+    lines.append('</tokens>\n')
+
+    with open(output_file, 'w') as f:
+        f.write(''.join(lines))
+    return output_file, len(lines) - 2, time.perf_counter() - start
+
 class JackAnalyzer:
     """
     The analyzer driver. It handles the input files and drives the process.
     For Project 10 (Stage 0), it generates XxxT.xml files using the Tokenizer.
+    The files of a directory are spread over jobs worker processes; timing
+    prints how long each file took.
     """
-    
-    def __init__(self):
-        pass
+
+    def __init__(self, jobs=1, timing=False):
+        self.jobs = jobs
+        self.timing = timing
 
     def run(self, input_path):
         """
@@ -18,63 +77,50 @@ class JackAnalyzer:
         and processes accordingly.
         """
         if os.path.isfile(input_path):
-            if input_path.endswith('.jack'):
-                self._analyze_file(input_path)
+            if not input_path.endswith('.jack'):
+                return
+            input_files = [input_path]
         elif os.path.isdir(input_path):
-            for filename in os.listdir(input_path):
-                if filename.endswith(".jack"):
-                    full_path = os.path.join(input_path, filename)
-                    self._analyze_file(full_path)
+            input_files = [
+                os.path.join(input_path, filename)
+                for filename in sorted(os.listdir(input_path))
+                if filename.endswith(".jack")
+            ]
         else:
             print(f"Error: The path '{input_path}' is invalid.")
+            return
+
+        start = time.perf_counter()
+        if self.jobs > 1 and len(input_files) > 1:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [pool.submit(analyze_file, f) for f in input_files]
+                results = [self._result(future.result) for future in futures]
+        else:
+            results = [self._result(analyze_file, f) for f in input_files]
+        elapsed = time.perf_counter() - start
+
+        if self.timing:
+            self._print_timing([result for result in results if result], elapsed)
 
-    def _analyze_file(self, input_file):
+    def _result(self, analyze, *args):
         """
-        Processes a single .jack file and generates a corresponding T.xml file.
+        Runs analyze(*args) and reports the file it created, or the error.
         """
-        output_file = input_file.replace('.jack', 'T.xml')
-        
         try:
-            tokenizer = JackTokenizer(input_file)
-            
-            with open(output_file, 'w') as f:
-                f.write('<tokens>\n')
-                
-                while tokenizer.has_more_tokens():
-                    tokenizer.advance()
-                    token_type = tokenizer.token_type()
-                    
-                    if token_type == KEYWORD:
-                        line = f"<keyword> {tokenizer.keyword()} </keyword>\n"
-                        
-                    elif token_type == SYMBOL:
-                        val = self._xml_escape(tokenizer.symbol())
-                        line = f"<symbol> {val} </symbol>\n"
-                        
-                    elif token_type == IDENTIFIER:
-                        line = f"<identifier> {tokenizer.identifier()} </identifier>\n"
-                        
-                    elif token_type == INT_CONST:
-                        line = f"<integerConstant> {tokenizer.int_val()} </integerConstant>\n"
-                        
-                    elif token_type == STRING_CONST:
-                        line = f"<stringConstant> {tokenizer.string_val()} </stringConstant>\n"
-                        
-                    f.write(line)
-                    
-                f.write('</tokens>\n')
-            
-            print(f"Created: {output_file}")
-            
+            result = analyze(*args)
         except IOError as e:
             print(f"File Error: {e}")
+            return None
+        print(f"Created: {result[0]}")
+        return result
 
-    def _xml_escape(self, val):
+    def _print_timing(self, results, elapsed):
         """
-        Helper method to handle XML special characters.
+        Prints the files slowest first, with their share of the work.
         """
-        if val == '<': return '&lt;'
-        if val == '>': return '&gt;'
-        if val == '"': return '&quot;'
-        if val == '&': return '&amp;'
-        return val
\ No newline at end of file
+        total = sum(seconds for _, _, seconds in results) or 1e-9
+        print(f"\nAnalysis time per file ({len(results)} files, {self.jobs} jobs):")
+        for output_file, tokens, seconds in sorted(results, key=lambda r: -r[2]):
+            print(f"   {os.path.basename(output_file):30} {tokens:9} tokens "
+                  f"{seconds * 1000:9.1f} ms {100 * seconds / total:5.1f}%")
+        print(f"   Work: {total * 1000:.1f} ms   Wall: {elapsed * 1000:.1f} ms")
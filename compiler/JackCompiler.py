@@ -0,0 +1,157 @@
+import os
+import TranslatorPath
+from JackTokenizer import JackTokenizer
+from CompilationEngine import CompilationEngine
+from VMWriter import VMWriter
+from CodeWriter import CodeWriter
+from Parser import Parser
+from PeepholeOptimizer import PeepholeOptimizer
+from VMOptimizer import VMOptimizer
+from HackAssembler import HackAssembler
+from HackEmulator import HackEmulator
+
+# Cycles --compare runs each build for, at most
+DEFAULT_MAX_CYCLES = 50_000_000
+
+class JackCompiler:
+    """
+    The compiler driver. Every .jack file is compiled in one pass, straight
+    from the token stream to VM commands: either Xxx.vm files, or
+    (compile_to_asm) Hack assembly for the whole project, with the commands
+    handed to the VM translator's CodeWriter in memory.
+    optimize and pool_strings turn on the CompilationEngine's own
+    optimizations.
+    """
+
+    def __init__(self, optimize=False, pool_strings=False, log=print):
+        self.optimize = optimize
+        self.pool_strings = pool_strings
+        self.log = log
+
+    def compile_file(self, jack_file, output):
+        """
+        Compiles one .jack file. output is anything VMWriter writes to: a
+        .vm file name, a stream, or a callable receiving Commands.
+        """
+        tokenizer = JackTokenizer(jack_file)
+        writer = VMWriter(output)
+        try:
+            CompilationEngine(tokenizer, writer, self.optimize,
+                              self.pool_strings).compile_class()
+        except ValueError as error:
+            raise ValueError(f"{os.path.basename(jack_file)}: {error}") from None
+        finally:
+            tokenizer.close()
+            writer.close()
+
+    def run(self, input_path):
+        """
+        Writes Xxx.vm next to every Xxx.jack of a file or a directory.
+        """
+        for jack_file in self._jack_files(input_path):
+            output_file = jack_file[:-len(".jack")] + ".vm"
+            self.compile_file(jack_file, output_file)
+            self.log(f"Created: {output_file}")
+
+    def compile_to_asm(self, input_path, output_file, optimize=False, vm_optimize=False):
+        """
+        Compiles a Jack file or project into one .asm file in this process.
+        The .vm files of a directory that have no .jack source (such as the
+        OS classes) are translated along with it. A directory gets the
+        bootstrap code, so its Sys.init is the entry point.
+        """
+        jack_files = self._jack_files(input_path)
+        classes = {os.path.basename(f)[:-len(".jack")] for f in jack_files}
+        vm_files = []
+        if os.path.isdir(input_path):
+            vm_files = [
+                os.path.join(input_path, f)
+                for f in sorted(os.listdir(input_path))
+                if f.endswith(".vm") and f[:-len(".vm")] not in classes
+            ]
+
+        optimizer = PeepholeOptimizer() if optimize else None
+        vm_optimizer = VMOptimizer() if vm_optimize else None
+        code_writer = CodeWriter(output_file, optimizer)
+        try:
+            if os.path.isdir(input_path):
+                code_writer.write_init()
+
+            for jack_file in jack_files:
+                class_name = os.path.basename(jack_file)[:-len(".jack")]
+                self.log(f"Compiling: {class_name}.jack")
+                code_writer.set_file_name(class_name)
+                if vm_optimizer:
+                    # The optimizer works on windows of commands: collect them first
+                    commands = []
+                    self.compile_file(jack_file, commands.append)
+                    for command in vm_optimizer.optimize(commands):
+                        code_writer.write_command(command)
+                else:
+                    self.compile_file(jack_file, code_writer.write_command)
+
+            for vm_file in vm_files:
+                self.log(f"Translating: {os.path.basename(vm_file)}")
+                code_writer.set_file_name(os.path.basename(vm_file))
+                commands = Parser(vm_file)
+                if vm_optimizer:
+                    commands = vm_optimizer.optimize(commands)
+                for command in commands:
+                    code_writer.write_command(command)
+        finally:
+            code_writer.close()
+
+        if vm_optimizer:
+            vm_optimizer.report(self.log)
+        if optimizer:
+            self.log(f"Peephole optimizer removed {optimizer.removed} instructions.")
+        self.log(f"Created: {output_file}")
+
+    def compare_cycles(self, input_path, max_cycles=DEFAULT_MAX_CYCLES,
+                       optimize=False, vm_optimize=False):
+        """
+        Builds a Jack project without and with the compiler optimizations
+        that are on (-J and -S; both if neither is), runs each build in the
+        HackEmulator until Sys.init halts (or max_cycles), and prints the
+        ROM size and cycles of each.
+        """
+        if not os.path.isdir(input_path):
+            raise ValueError("comparing cycles needs a project directory with Sys.init")
+        log, settings = self.log, (self.optimize, self.pool_strings)
+        enabled = settings if any(settings) else (True, True)
+        names = " and ".join(name for name, on in zip(("-J", "-S"), enabled) if on)
+        self.log = lambda *message: None
+        results = []
+        try:
+            for self.optimize, self.pool_strings in ((False, False), enabled):
+                assembler = HackAssembler()
+                self.compile_to_asm(input_path, assembler, optimize, vm_optimize)
+                emulator = HackEmulator(assembler.finish())
+                cycles = emulator.run(max_cycles)
+                results.append((len(emulator.instructions), cycles, emulator.halted))
+        finally:
+            self.log = log
+            self.optimize, self.pool_strings = settings
+
+        log(f"\nJack compiler optimizations ({names}):")
+        for name, (rom, cycles, halted) in zip(("off", "on"), results):
+            note = "" if halted else f"  (stopped after {max_cycles} cycles)"
+            log(f"   {name:4} ROM {rom:6}   cycles {cycles:10}{note}")
+        (rom_off, cycles_off, _), (rom_on, cycles_on, _) = results
+        if cycles_off:
+            log(f"   ROM {rom_on - rom_off:+d} instructions, cycles {cycles_on - cycles_off:+d} "
+                f"({100 * (cycles_on - cycles_off) / cycles_off:+.1f}%)")
+        return results
+
+    def _jack_files(self, input_path):
+        if os.path.isfile(input_path):
+            if not input_path.endswith(".jack"):
+                raise ValueError(f"'{input_path}' is not a .jack file")
+            return [input_path]
+        if os.path.isdir(input_path):
+            return [
+                os.path.join(input_path, f)
+                for f in sorted(os.listdir(input_path))
+                if f.endswith(".jack")
+            ]
+        raise ValueError(f"The path '{input_path}' is invalid.")
@@ -1,46 +1,177 @@
 import re
+from collections import deque
 from Constants import *
 
+# One pattern for the whole scan, compiled once. Each match skips the
+# whitespace and comments in front of a token, then matches the token in
+# the group of its type (WORD is a keyword or an identifier), so comments
+# need no separate pass and every character is looked at once.
+# OPEN_COMMENT is a block comment that does not end in the text, END the
+# whitespace and comments after the last token.
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:(?://[^\n]*|/\*[\s\S]*?\*/)\s*)*
+    (?:
+        (?P<WORD>[a-zA-Z_]\w*)
+      | (?P<OPEN_COMMENT>/\*)
+      | (?P<SYMBOL>[{}()\[\].,;+\-*/&|<>=~])
+      | (?P<INT_CONST>\d+)
+      | "(?P<STRING_CONST>[^"\n]*)"
+      | (?P<END>\Z)
+      | (?P<OTHER>.)
+    )
+""", re.VERBOSE)
+
+# Token types by group number
+WORD, OPEN_COMMENT, STRING, END = 1, 2, 5, 6
+GROUP_TYPES = (None, None, None, SYMBOL, INT_CONST, STRING_CONST)
+
+# Tokens that peek() can look past the current one
+DEFAULT_LOOKAHEAD = 2
+
+# Characters the streaming tokenizer reads at a time (in whole lines)
+CHUNK_SIZE = 1 << 14
+
+def scan(text, line=1, column=1):
+    """
+    Yields a (type, value, line, column) record for every token of text,
+    in one pass. String constants are given without their quotes.
+    Characters that start no token are skipped.
+    Returns the index in text of a block comment that does not end in it,
+    or None.
+    """
+    find = text.find
+    # Where the current line starts in text (negative: text starts at column)
+    line_start = 1 - column
+    next_newline = find("\n")
+    if next_newline < 0:
+        next_newline = len(text)
+
+    for match in TOKEN_PATTERN.finditer(text):
+        group = match.lastindex
+        start, end = match.span(group)
+        while start > next_newline:
+            line += 1
+            line_start = next_newline + 1
+            next_newline = find("\n", line_start)
+            if next_newline < 0:
+                next_newline = len(text)
+
+        if group == WORD:
+            value = text[start:end]
+            yield (KEYWORD if value in KEYWORDS else IDENTIFIER), value, line, start - line_start + 1
+        elif group < END and group != OPEN_COMMENT:
+            # Strings start one column before their group, at the quote
+            yield (GROUP_TYPES[group], text[start:end], line,
+                   start - line_start + (0 if group == STRING else 1))
+        elif group == OPEN_COMMENT:
+            return start
+        elif group == END:
+            return None
+    return None
+
+def scan_file(file, chunk_size=CHUNK_SIZE):
+    """
+    Yields the records of an open file, scanned chunk_size characters (of
+    whole lines) at a time. A block comment left open at the end of a
+    chunk is carried over to the next one.
+    """
+    line, column = 1, 1
+    carry = ""
+    while True:
+        lines = file.readlines(chunk_size)
+        if not lines:
+            return
+        text = carry + "".join(lines)
+        open_comment = yield from scan(text, line, column)
+        if open_comment is None:
+            line += text.count("\n")
+            column, carry = 1, ""
+            continue
+        newlines = text.count("\n", 0, open_comment)
+        if newlines:
+            column = open_comment - text.rfind("\n", 0, open_comment)
+        else:
+            column += open_comment
+        line += newlines
+        carry = text[open_comment:]
+
 class JackTokenizer:
-    def __init__(self, file):
-        with open(file, 'r') as f:
-            self.content = f.read()
-        
+    """
+    Token stream of one .jack file. By default the file is read a chunk
+    at a time as tokens are consumed, and at most lookahead tokens past
+    the current one are buffered (for peek), so memory does not grow with
+    the file. stream=False reads the whole file text first.
+    """
+
+    def __init__(self, file, lookahead=DEFAULT_LOOKAHEAD, stream=True):
+        self.lookahead = lookahead
+        self.buffer = deque()
+        if stream:
+            self.file = open(file, 'r')
+            self.records = scan_file(self.file)
+        else:
+            with open(file, 'r') as f:
+                self.file = None
+                self.records = scan(f.read())
+
         self.current_token = None
-        self.token_index = -1
-        self.tokens = self._tokenize(self.content)
-
-    def _tokenize(self, content):
-        comment_pattern = r'//.*|/\*[\s\S]*?\*/'
-        content_no_comments = re.sub(comment_pattern, '', content)
-        symbol_pattern = r'[{}()\[\].,;+\-*/&|<>=~]'
-        int_pattern = r'\d+'
-        string_pattern = r'"[^"\n]*"'  
-        identifier_pattern = r'[a-zA-Z_]\w*'
-
-        
-        token_pattern = re.compile(f'{string_pattern}|{symbol_pattern}|{int_pattern}|{identifier_pattern}')
-        
-        return token_pattern.findall(content_no_comments)    
+        self.current = None
+
+    @classmethod
+    def from_records(cls, records, lookahead=DEFAULT_LOOKAHEAD):
+        """
+        A tokenizer over records scanned earlier (see scan), e.g. kept in
+        memory between builds. No file is read.
+        """
+        tokenizer = cls.__new__(cls)
+        tokenizer.lookahead = lookahead
+        tokenizer.buffer = deque()
+        tokenizer.file = None
+        tokenizer.records = iter(records)
+        tokenizer.current_token = None
+        tokenizer.current = None
+        return tokenizer
+
+    def _fill(self, count):
+        """
+        Reads tokens until count are buffered. Returns False at the end.
+        """
+        buffer = self.buffer
+        while len(buffer) < count:
+            record = next(self.records, None)
+            if record is None:
+                self.close()
+                return False
+            buffer.append(record)
+        return True
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
 
     def has_more_tokens(self):
-        return self.token_index < len(self.tokens) - 1
+        return bool(self.buffer) or self._fill(1)
 
     def advance(self):
-        self.token_index += 1
-        self.current_token = self.tokens[self.token_index]
+        if not self.buffer:
+            self._fill(1)
+        self.current = self.buffer.popleft()
+        self.current_token = self.current[1]
+
+    def peek(self, ahead=1):
+        """
+        The (type, value, line, column) record ahead tokens past the
+        current one, or None past the end.
+        """
+        if not 1 <= ahead <= self.lookahead:
+            raise ValueError(f"peek({ahead}) is beyond the lookahead of {self.lookahead} tokens")
+        if len(self.buffer) < ahead and not self._fill(ahead):
+            return None
+        return self.buffer[ahead - 1]
 
     def token_type(self):
-        token = self.current_token
-        if token in KEYWORDS:
-            return KEYWORD
-        if token in SYMBOLS:
-            return SYMBOL
-        if token.isdigit():
-            return INT_CONST
-        if token.startswith('"'):
-            return STRING_CONST
-        return IDENTIFIER
+        return self.current[0]
 
     def keyword(self):
         return self.current_token
@@ -55,4 +186,10 @@ class JackTokenizer:
         return int(self.current_token)
 
     def string_val(self):
-        return self.current_token[1:-1]
\ No newline at end of file
+        return self.current_token
+
+    def line(self):
+        return self.current[2]
+
+    def column(self):
+        return self.current[3]
@@ -1,16 +1,75 @@
-
 import sys
+import os
+import argparse
+import TranslatorPath
 
 from JackAnalyzer import JackAnalyzer
+from JackCompiler import JackCompiler, DEFAULT_MAX_CYCLES
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(
+        usage="python Main.py [options] <file.jack or directory>",
+        description="Writes the XxxT.xml token files of Jack sources, or compiles them "
+                    "to VM code (--vm) or to a single Hack assembly file (--asm)."
+    )
+    arg_parser.add_argument("input_path", help="a .jack file or a directory of .jack files")
+    mode = arg_parser.add_mutually_exclusive_group()
+    mode.add_argument("--vm", action="store_true",
+                      help="compile every Xxx.jack to Xxx.vm")
+    mode.add_argument("--asm", action="store_true",
+                      help="compile the whole project to Hack assembly in one process, "
+                           "with the .vm files that have no .jack source (e.g. the OS)")
+    mode.add_argument("--compare", action="store_true",
+                      help="build a project without and with -J/-S (both if neither is "
+                           "given), run both in the Hack emulator and compare their ROM "
+                           "size and cycles")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="token XML: analyze the files of a directory in N processes")
+    arg_parser.add_argument("--timing", action="store_true",
+                            help="token XML: print the time each file took, slowest first")
+    arg_parser.add_argument("-J", "--optimize-jack", action="store_true",
+                            help="--vm/--asm: fold constant expressions, multiply by powers "
+                                 "of two with additions and shorten if/while conditions")
+    arg_parser.add_argument("-S", "--pool-strings", action="store_true",
+                            help="--vm/--asm: build each distinct string literal once, in a "
+                                 "static slot, and reuse it (literals must not be changed)")
+    arg_parser.add_argument("--max-cycles", type=int, default=DEFAULT_MAX_CYCLES,
+                            help="--compare: cycles each build may run before it is stopped")
+    arg_parser.add_argument("-o", "--output",
+                            help="--asm output file (default: Xxx.asm, after the file or directory)")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="--asm/--compare: run the peephole optimizer over the assembly")
+    arg_parser.add_argument("-V", "--vm-optimize", action="store_true",
+                            help="--asm/--compare: fold constants and fuse VM command sequences")
+    return arg_parser.parse_args()
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python JackAnalyzer.py <file.jack or directory>")
+    args = parse_args()
+    path = args.input_path
+
+    if not args.vm and not args.asm and not args.compare:
+        analyzer = JackAnalyzer(args.jobs, args.timing)
+        analyzer.run(path)
         return
 
-    path = sys.argv[1]    
-    analyzer = JackAnalyzer()
-    analyzer.run(path)
+    compiler = JackCompiler(args.optimize_jack, args.pool_strings)
+    try:
+        if args.vm:
+            compiler.run(path)
+        elif args.compare:
+            compiler.compare_cycles(path, args.max_cycles, args.optimize, args.vm_optimize)
+        else:
+            if args.output:
+                output_file = args.output
+            elif os.path.isdir(path):
+                dir_name = os.path.basename(os.path.normpath(path))
+                output_file = os.path.join(path, dir_name + ".asm")
+            else:
+                output_file = path[:-len(".jack")] + ".asm"
+            compiler.compile_to_asm(path, output_file, args.optimize, args.vm_optimize)
+    except (OSError, ValueError) as error:
+        print(f"Error: {error}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+# Identifier kinds, and the VM segment each one lives in
+STATIC = "static"
+FIELD = "field"
+ARG = "arg"
+VAR = "var"
+
+SEGMENTS = {
+    STATIC: "static",
+    FIELD: "this",
+    ARG: "argument",
+    VAR: "local",
+}
+
+Symbol = namedtuple("Symbol", ["type", "kind", "index"])
+
+class SymbolTable:
+    """
+    The two scopes of a Jack class: statics and fields live as long as the
+    class, arguments and locals are reset for every subroutine. Each kind
+    is numbered from 0 in order of definition, which is its index in the
+    kind's VM segment.
+    """
+
+    def __init__(self):
+        self.class_scope = {}
+        self.subroutine_scope = {}
+        self.counts = {STATIC: 0, FIELD: 0, ARG: 0, VAR: 0}
+
+    def start_subroutine(self):
+        self.subroutine_scope = {}
+        self.counts[ARG] = 0
+        self.counts[VAR] = 0
+
+    def define(self, name, type, kind):
+        scope = self.class_scope if kind in (STATIC, FIELD) else self.subroutine_scope
+        scope[name] = Symbol(type, kind, self.counts[kind])
+        self.counts[kind] += 1
+
+    def var_count(self, kind):
+        return self.counts[kind]
+
+    def lookup(self, name):
+        """
+        The Symbol of a name (subroutine scope first), or None.
+        """
+        symbol = self.subroutine_scope.get(name)
+        return symbol if symbol is not None else self.class_scope.get(name)
+
+    def kind_of(self, name):
+        symbol = self.lookup(name)
+        return symbol.kind if symbol else None
+
+    def type_of(self, name):
+        return self.lookup(name).type
+
+    def index_of(self, name):
+        return self.lookup(name).index
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The compiler writes VM commands with the VM translator's own classes,
+# and --asm, --compare and the build daemon run its code writer,
+# assembler and emulator. Importing this module puts vm_emulator on the
+# path: the compiler's modules import it before any vm_emulator module.
+VM_EMULATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vm_emulator")
+
+if VM_EMULATOR_DIR not in sys.path:
+    sys.path.append(VM_EMULATOR_DIR)
@@ -0,0 +1,71 @@
+import TranslatorPath
+# The VM command types are shared with the VM translator
+from Command import Command, format_command
+from CommandType import CommandType
+
+class VMWriter:
+    """
+    Writes VM commands for the CompilationEngine.
+    output is a .vm file name, an open text stream, or a callable that
+    receives every command as a vm_emulator Command - e.g. list.append or
+    CodeWriter.write_command, so compiled code can go straight to the
+    translator in memory without VM text in between.
+    """
+
+    def __init__(self, output):
+        self.owns_stream = False
+        self.emit = None
+        self.stream = None
+        if callable(output):
+            self.emit = output
+        elif hasattr(output, "write"):
+            self.stream = output
+        else:
+            self.stream = open(output, 'w')
+            self.owns_stream = True
+
+    def _write(self, command_type, arg1, arg2, text):
+        if self.emit:
+            self.emit(Command(command_type, arg1, arg2))
+        else:
+            self.stream.write(text)
+
+    def write_command(self, command):
+        """
+        Writes a Command as it is, e.g. one collected from another VMWriter.
+        """
+        if self.emit:
+            self.emit(command)
+        else:
+            self.stream.write(format_command(command) + "\n")
+
+    def write_push(self, segment, index):
+        self._write(CommandType.PUSH, segment, index, f"push {segment} {index}\n")
+
+    def write_pop(self, segment, index):
+        self._write(CommandType.POP, segment, index, f"pop {segment} {index}\n")
+
+    def write_arithmetic(self, command):
+        self._write(CommandType.ARITHMETIC, command, None, f"{command}\n")
+
+    def write_label(self, label):
+        self._write(CommandType.LABEL, label, None, f"label {label}\n")
+
+    def write_goto(self, label):
+        self._write(CommandType.GOTO, label, None, f"goto {label}\n")
+
+    def write_if(self, label):
+        self._write(CommandType.IF, label, None, f"if-goto {label}\n")
+
+    def write_call(self, name, total_args):
+        self._write(CommandType.CALL, name, total_args, f"call {name} {total_args}\n")
+
+    def write_function(self, name, total_locals):
+        self._write(CommandType.FUNCTION, name, total_locals, f"function {name} {total_locals}\n")
+
+    def write_return(self):
+        self._write(CommandType.RETURN, None, None, "return\n")
+
+    def close(self):
+        if self.owns_stream:
+            self.stream.close()
@@ -0,0 +1,45 @@
+# Characters collected before a chunk is handed to the underlying stream
+CHUNK_SIZE = 1 << 16
+
+class ChunkedWriter:
+    """
+    Collects the many small writes of CodeWriter and passes them on to the
+    output stream in large chunks. Chunks always end on a line boundary
+    (every write ends with a newline), so an optional transform - such as
+    the peephole optimizer - can rewrite each chunk as a list of lines.
+    Memory use is bounded by the chunk size, whatever the program size.
+    """
+
+    def __init__(self, stream, transform=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.transform = transform
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def write_raw(self, text):
+        """
+        Writes text to the stream as it is, bypassing the transform.
+        """
+        self.flush()
+        self.stream.write(text)
+
+    def flush(self):
+        if not self.parts:
+            return
+        chunk = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        if self.transform:
+            chunk = "\n".join(self.transform(chunk.splitlines())) + "\n"
+        self.stream.write(chunk)
+
+    def close(self):
+        self.flush()
+        self.stream.flush()
@@ -1,4 +1,8 @@
+import io
+import sys
 from CommandType import CommandType
+from Command import format_command
+from ChunkedWriter import ChunkedWriter
 
 SEGMENT_POINTERS = {
     "local": "LCL",
@@ -7,13 +11,56 @@ SEGMENT_POINTERS = {
     "that": "THAT"
 }
 
+# Functions with more locals zero them in a loop instead of one by one
+ZERO_LOOP_THRESHOLD = 16
+
+# Commands that work with a stack top cached in D; any other command
+# spills it first
+CACHED_COMMANDS = {
+    CommandType.ARITHMETIC, CommandType.PUSH, CommandType.POP, CommandType.IF,
+    CommandType.COMPARE, CommandType.BRANCH,
+}
+
 class CodeWriter:
     
-    def __init__(self, output_file):
+    def __init__(self, output_file, optimizer=None, compact=False, cache_top=False,
+                 source_map=False):
         self.output_file = output_file
-        self.file = open(self.output_file, 'w')
+        self.optimizer = optimizer
+        # Stack-top caching: the top of the stack may live only in D, one
+        # slot past SP. It is spilled to memory before anything that needs
+        # the whole stack in RAM (labels, jumps, calls, returns...).
+        self.cache_top = cache_top
+        self.top_in_d = False
+        # Compact mode: call, return and eq/gt/lt jump to shared runtime
+        # subroutines instead of inlining their templates.
+        self.compact = compact
+        self.runtime_written = False
+        self.compact_sites = {"call": 0, "return": 0, "compare": 0}
+        # Source map: every command is preceded by a "//# file:line function
+        # | command" marker comment, which SourceMap reads back from the
+        # assembly to map ROM addresses to VM code.
+        self.source_map = source_map
+        self.current_function = None
+        self.marker = None
+        # Output goes out in large chunks; with an optimizer each chunk is
+        # rewritten on its way to the file. "-" writes to stdout, and an
+        # open stream (e.g. io.StringIO) is written to as it is.
+        self.owns_stream = False
+        if self.output_file == "-":
+            self.stream = sys.stdout
+        elif hasattr(self.output_file, "write"):
+            self.stream = self.output_file
+        else:
+            self.stream = open(self.output_file, 'w')
+            self.owns_stream = True
+        transform = self.optimizer.optimize if self.optimizer else None
+        self.file = ChunkedWriter(self.stream, transform)
         self.label_count = 0
         self.function_count = 0
+        # Prefix for generated labels, so that fragments translated on their
+        # own (one per .vm file) never collide once they are joined.
+        self.label_scope = ""
 
     def write_init(self):
         """
@@ -22,6 +69,7 @@ class CodeWriter:
         2. call Sys.init 0
         """
         self.file.write("// Bootstrap Code\n")
+        self.mark("<bootstrap>", 0, "<bootstrap>", "call Sys.init 0")
         
         # --- Task 1: Set SP = 256 ---
         self.file.write("@256\n")
@@ -32,8 +80,49 @@ class CodeWriter:
         # --- Task 2: Call Sys.init ---
         # We reuse the write_call method to handle the complex stack logic
         # of saving the frame and jumping.
+        self.runtime_written = self.compact
         self.write_call("Sys.init", 0)    
 
+        # --- Task 3: Shared runtime (compact mode) ---
+        # Sys.init never returns, so the subroutines can live right after it.
+        if self.compact:
+            self._write_runtime()
+
+    def write_command(self, command):
+        """
+        Writes the assembly code for one decoded Command from the Parser.
+        """
+        command_type = command.type
+        if self.top_in_d and command_type not in CACHED_COMMANDS:
+            self.spill()
+        if command_type == CommandType.FUNCTION:
+            self.current_function = command.arg1
+        if self.source_map:
+            self.mark(f"{getattr(self, 'filename', 'Unknown')}.vm", command.line or 0,
+                      self.current_function, format_command(command))
+        if command_type == CommandType.ARITHMETIC:
+            self.write_arithmetic(command.arg1)
+        elif command_type in (CommandType.PUSH, CommandType.POP):
+            self.write_push_pop(command_type, command.arg1, command.arg2, command.arg3)
+        elif command_type == CommandType.RETURN:
+            self.write_return()
+        elif command_type == CommandType.GOTO:
+            self.write_goto(command.arg1)
+        elif command_type == CommandType.IF:
+            self.write_if(command.arg1)
+        elif command_type == CommandType.LABEL:
+            self.write_label(command.arg1)
+        elif command_type == CommandType.FUNCTION:
+            self.write_function(command.arg1, command.arg2)
+        elif command_type == CommandType.CALL:
+            self.write_call(command.arg1, command.arg2)
+        elif command_type == CommandType.INCREMENT:
+            self.write_increment(command.arg1, command.arg2, command.arg3)
+        elif command_type == CommandType.COMPARE:
+            self.write_compare(command.arg1, command.arg2)
+        elif command_type == CommandType.BRANCH:
+            self.write_branch(command.arg1, command.arg2, command.arg3)
+
     def write_arithmetic(self, command):
         """
         Writes the assembly code that is the translation of the given 
@@ -42,6 +131,11 @@ class CodeWriter:
         # Debug comment to make the asm file readable
         self.file.write(f"// {command}\n")
 
+        if self.cache_top and not (self.compact and command in ['eq', 'gt', 'lt']):
+            self._write_arithmetic_cached(command)
+            return
+        self.spill()
+
         # --- Binary Operators (add, sub, and, or) ---
         if command in ['add', 'sub', 'and', 'or']:
             self.file.write("@SP\n")
@@ -68,6 +162,21 @@ class CodeWriter:
             elif command == 'not':
                 self.file.write("M=!M\n") # y = !y
 
+        # --- Comparison Operators, compact mode ---
+        # Jump to the shared VM$EQ / VM$GT / VM$LT routine with the
+        # return address in D.
+        elif command in ['eq', 'gt', 'lt'] and self.compact:
+            self.ensure_runtime()
+            return_label = f"RET_CMP_{self.label_scope}{self.label_count}"
+            self.label_count += 1
+            self.compact_sites["compare"] += 1
+
+            self.file.write(f"@{return_label}\n")
+            self.file.write("D=A\n")
+            self.file.write(f"@VM${command.upper()}\n")
+            self.file.write("0;JMP\n")
+            self.file.write(f"({return_label})\n")
+
         # --- Comparison Operators (eq, gt, lt) ---
         elif command in ['eq', 'gt', 'lt']:
             self.file.write("@SP\n")
@@ -77,8 +186,8 @@ class CodeWriter:
             self.file.write("D=M-D\n")    # D = x - y
             
             # Generate unique labels for this specific comparison
-            label_true = f"TRUE_{self.label_count}"
-            label_end = f"END_{self.label_count}"
+            label_true = f"TRUE_{self.label_scope}{self.label_count}"
+            label_end = f"END_{self.label_scope}{self.label_count}"
             self.label_count += 1
             
             self.file.write(f"@{label_true}\n")
@@ -104,13 +213,18 @@ class CodeWriter:
             self.file.write("M=-1\n")      # Set stack top to True (-1)
             self.file.write(f"({label_end})\n")
 
-    def write_push_pop(self, command, segment, index):
+    def write_push_pop(self, command, segment, index, file_name=None):
         """
         Writes the assembly code that is the translation of the given 
         command, where command is either C_PUSH or C_POP.
+        file_name overrides the file that scopes a static (inlined code).
         """
         self.file.write(f"// {command} {segment} {index}\n")
 
+        if self.cache_top:
+            self._write_push_pop_cached(command, segment, index, file_name)
+            return
+
         # -----------------------------------------------------------
         # HANDLING PUSH
         # -----------------------------------------------------------
@@ -119,8 +233,13 @@ class CodeWriter:
             # 1. Constant Segment (Slide 21)
             # Logic: *SP = i, SP++
             if segment == "constant":
-                self.file.write(f"@{index}\n")
-                self.file.write("D=A\n")
+                if index > 0x7FFF:
+                    # Folded by VMOptimizer: too large for @, load its complement
+                    self.file.write(f"@{~index & 0xFFFF}\n")
+                    self.file.write("D=!A\n")
+                else:
+                    self.file.write(f"@{index}\n")
+                    self.file.write("D=A\n")
                 self.file.write("@SP\n")
                 self.file.write("A=M\n")
                 self.file.write("M=D\n")
@@ -179,7 +298,7 @@ class CodeWriter:
             # Logic: @FileName.i
             elif segment == "static":
                 # Ensure you have self.filename set! Default to 'Unknown' if not.
-                filename = getattr(self, 'filename', 'Unknown')
+                filename = file_name or getattr(self, 'filename', 'Unknown')
                 self.file.write(f"@{filename}.{index}\n")
                 self.file.write("D=M\n")
                 
@@ -245,7 +364,7 @@ class CodeWriter:
 
             # 4. Static Segment
             elif segment == "static":
-                filename = getattr(self, 'filename', 'Unknown')
+                filename = file_name or getattr(self, 'filename', 'Unknown')
                 self.file.write("@SP\n")
                 self.file.write("AM=M-1\n")
                 self.file.write("D=M\n")
@@ -253,6 +372,261 @@ class CodeWriter:
                 self.file.write(f"@{filename}.{index}\n")
                 self.file.write("M=D\n")
 
+    # -----------------------------------------------------------
+    # SUPERINSTRUCTIONS (built by VMOptimizer)
+    # -----------------------------------------------------------
+
+    def write_increment(self, segment, index, delta):
+        """
+        segment[index] += delta, in place instead of through the stack.
+        """
+        self.file.write(f"// increment {segment} {index} {delta}\n")
+
+        # With a delta of +-1 the update needs no D register
+        unit = delta in (1, -1)
+        if unit:
+            update = "M=M+1" if delta == 1 else "M=M-1"
+        else:
+            update = "M=D+M" if delta > 0 else "M=M-D"
+
+        if segment in SEGMENT_POINTERS:
+            pointer = SEGMENT_POINTERS[segment]
+            if unit and index:
+                self.file.write(f"@{index}\n")
+                self.file.write("D=A\n")
+                self.file.write(f"@{pointer}\n")
+                self.file.write("A=D+M\n")     # A = base + index
+            elif unit or index <= 3:
+                if not unit:
+                    self.file.write(f"@{abs(delta)}\n")
+                    self.file.write("D=A\n")
+                self.file.write(f"@{pointer}\n")
+                self.file.write("A=M\n")
+                for _ in range(index):
+                    self.file.write("A=A+1\n")
+            else:
+                # Both the address and the delta need D: park the address
+                self.file.write(f"@{pointer}\n")
+                self.file.write("D=M\n")
+                self.file.write(f"@{index}\n")
+                self.file.write("D=D+A\n")
+                self.file.write("@R13\n")
+                self.file.write("M=D\n")
+                self.file.write(f"@{abs(delta)}\n")
+                self.file.write("D=A\n")
+                self.file.write("@R13\n")
+                self.file.write("A=M\n")
+        else:
+            if not unit:
+                self.file.write(f"@{abs(delta)}\n")
+                self.file.write("D=A\n")
+            if segment == "temp":
+                self.file.write(f"@{5 + index}\n")
+            else:
+                filename = getattr(self, 'filename', 'Unknown')
+                self.file.write(f"@{filename}.{index}\n")
+
+        self.file.write(f"{update}\n")
+
+    def write_compare(self, command, constant):
+        """
+        Replaces the top of the stack with (top eq/gt/lt constant).
+        """
+        self.file.write(f"// {command} {constant}\n")
+        label_true = f"TRUE_{self.label_scope}{self.label_count}"
+        self.label_count += 1
+
+        if self.cache_top:
+            # The result stays in D
+            label_end = f"END_{self.label_scope}{self.label_count - 1}"
+            self._load_top()                   # D = x
+            if constant:
+                self.file.write(f"@{constant}\n")
+                self.file.write("D=D-A\n")
+            self.file.write(f"@{label_true}\n")
+            self.file.write(f"D;J{command.upper()}\n")
+            self.file.write("D=0\n")
+            self.file.write(f"@{label_end}\n")
+            self.file.write("0;JMP\n")
+            self.file.write(f"({label_true})\n")
+            self.file.write("D=-1\n")
+            self.file.write(f"({label_end})\n")
+            self.top_in_d = True
+            return
+
+        self.file.write("@SP\n")
+        self.file.write("A=M-1\n")
+        self.file.write("D=M\n")          # D = x
+        if constant:
+            self.file.write(f"@{constant}\n")
+            self.file.write("D=D-A\n")    # D = x - constant
+            self.file.write("@SP\n")
+            self.file.write("A=M-1\n")
+        self.file.write("M=-1\n")         # assume true
+        self.file.write(f"@{label_true}\n")
+        self.file.write(f"D;J{command.upper()}\n")
+        self.file.write("@SP\n")
+        self.file.write("A=M-1\n")
+        self.file.write("M=0\n")          # false
+        self.file.write(f"({label_true})\n")
+
+    def write_branch(self, label, jump, constant):
+        """
+        Pops x (and y) and jumps to label if x - y (or x - constant)
+        satisfies jump, without pushing the boolean first.
+        """
+        self.file.write(f"// if-goto {label} on {jump} {'' if constant is None else constant}\n")
+        if self.cache_top:
+            self._load_top()
+        else:
+            self.file.write("@SP\n")
+            self.file.write("AM=M-1\n")
+            self.file.write("D=M\n")      # D = y, or x
+        if constant is None:
+            self.file.write("@SP\n")
+            self.file.write("AM=M-1\n")
+            self.file.write("D=M-D\n")    # D = x - y
+        elif constant:
+            self.file.write(f"@{constant}\n")
+            self.file.write("D=D-A\n")    # D = x - constant
+        self.file.write(f"@{label}\n")
+        self.file.write(f"D;{jump}\n")
+
+    # -----------------------------------------------------------
+    # STACK-TOP CACHING
+    # -----------------------------------------------------------
+
+    def spill(self):
+        """
+        Moves a top of stack held in D to memory: *SP = D, SP++.
+        """
+        if not self.top_in_d:
+            return
+        self.top_in_d = False
+        self.file.write("@SP\n")
+        self.file.write("AM=M+1\n")
+        self.file.write("A=A-1\n")
+        self.file.write("M=D\n")
+
+    def _load_top(self):
+        """
+        Makes D hold the top of the stack and takes it off the stack.
+        """
+        if self.top_in_d:
+            self.top_in_d = False
+            return
+        self.file.write("@SP\n")
+        self.file.write("AM=M-1\n")
+        self.file.write("D=M\n")
+
+    def _write_arithmetic_cached(self, command):
+        """
+        The arithmetic templates with the result left in D. y comes from D
+        (or the stack), x is popped and combined with it in one step.
+        """
+        if command in ['neg', 'not']:
+            if self.top_in_d:
+                self.file.write("D=-D\n" if command == 'neg' else "D=!D\n")
+            else:
+                self.file.write("@SP\n")
+                self.file.write("AM=M-1\n")
+                self.file.write("D=-M\n" if command == 'neg' else "D=!M\n")
+            self.top_in_d = True
+            return
+
+        self._load_top()                   # D = y
+        self.file.write("@SP\n")
+        self.file.write("AM=M-1\n")       # pop x
+        if command == 'add':
+            self.file.write("D=D+M\n")
+        elif command == 'sub':
+            self.file.write("D=M-D\n")
+        elif command == 'and':
+            self.file.write("D=D&M\n")
+        elif command == 'or':
+            self.file.write("D=D|M\n")
+        else:
+            self.file.write("D=M-D\n")    # D = x - y
+            label_true = f"TRUE_{self.label_scope}{self.label_count}"
+            label_end = f"END_{self.label_scope}{self.label_count}"
+            self.label_count += 1
+            self.file.write(f"@{label_true}\n")
+            self.file.write(f"D;J{command.upper()}\n")
+            self.file.write("D=0\n")
+            self.file.write(f"@{label_end}\n")
+            self.file.write("0;JMP\n")
+            self.file.write(f"({label_true})\n")
+            self.file.write("D=-1\n")
+            self.file.write(f"({label_end})\n")
+        self.top_in_d = True
+
+    def _write_push_pop_cached(self, command, segment, index, file_name=None):
+        """
+        push loads the value into D (spilling the previous top first); pop
+        stores D, so a push followed by a pop never touches the stack.
+        """
+        if command == CommandType.PUSH:
+            self.spill()
+            if segment == "constant":
+                if index > 0x7FFF:
+                    self.file.write(f"@{~index & 0xFFFF}\n")
+                    self.file.write("D=!A\n")
+                else:
+                    self.file.write(f"@{index}\n")
+                    self.file.write("D=A\n")
+            elif segment in SEGMENT_POINTERS:
+                self.file.write(f"@{SEGMENT_POINTERS[segment]}\n")
+                if index == 0:
+                    self.file.write("A=M\n")
+                elif index == 1:
+                    self.file.write("A=M+1\n")
+                else:
+                    self.file.write("D=M\n")
+                    self.file.write(f"@{index}\n")
+                    self.file.write("A=D+A\n")
+                self.file.write("D=M\n")
+            else:
+                self.file.write(f"@{self._fixed_address(segment, index, file_name)}\n")
+                self.file.write("D=M\n")
+            self.top_in_d = True
+            return
+
+        self._load_top()
+        if segment in SEGMENT_POINTERS and index <= 2:
+            self.file.write(f"@{SEGMENT_POINTERS[segment]}\n")
+            self.file.write("A=M\n")
+            for _ in range(index):
+                self.file.write("A=A+1\n")
+            self.file.write("M=D\n")
+        elif segment in SEGMENT_POINTERS:
+            # D holds the value: keep it in R13 while the address goes to R14
+            self.file.write("@R13\n")
+            self.file.write("M=D\n")
+            self.file.write(f"@{SEGMENT_POINTERS[segment]}\n")
+            self.file.write("D=M\n")
+            self.file.write(f"@{index}\n")
+            self.file.write("D=D+A\n")
+            self.file.write("@R14\n")
+            self.file.write("M=D\n")
+            self.file.write("@R13\n")
+            self.file.write("D=M\n")
+            self.file.write("@R14\n")
+            self.file.write("A=M\n")
+            self.file.write("M=D\n")
+        else:
+            self.file.write(f"@{self._fixed_address(segment, index, file_name)}\n")
+            self.file.write("M=D\n")
+
+    def _fixed_address(self, segment, index, file_name=None):
+        """
+        The address symbol of a temp, pointer or static cell.
+        """
+        if segment == "temp":
+            return 5 + index
+        if segment == "pointer":
+            return "THAT" if index else "THIS"
+        return f"{file_name or getattr(self, 'filename', 'Unknown')}.{index}"
+
     def write_goto(self, label):
         self.file.write(f"@{label}\n")
         self.file.write("0;JMP\n")
@@ -261,25 +635,87 @@ class CodeWriter:
         self.file.write(f"({label})\n")
 
     def write_if(self, label):
-        self.file.write("@SP\n")
-        self.file.write("AM=M-1\n")
-        self.file.write("D=M\n")
+        if self.cache_top:
+            self._load_top()
+        else:
+            self.file.write("@SP\n")
+            self.file.write("AM=M-1\n")
+            self.file.write("D=M\n")
         self.file.write(f"@{label}\n")
         self.file.write("D;JNE\n")
 
     def write_function(self, function_name, total_vars):
+        """
+        Writes the function label and zeroes its locals.
+        1. One local: push 0 in four instructions
+        2. Up to ZERO_LOOP_THRESHOLD locals: one SP load, M=0 / A=A+1 for
+           each local, one final SP update (2N + 4 instructions and cycles)
+        3. More locals: a loop over the offsets from SP, a constant 12
+           instructions of ROM for 6N + 6 cycles
+        """
         self.file.write(f"({function_name})\n")
-        for i in range(int(total_vars)):
+        total_vars = int(total_vars)
+        if total_vars == 0:
+            return
+
+        if total_vars == 1:
+            self.file.write("@SP\n")
+            self.file.write("AM=M+1\n")
+            self.file.write("A=A-1\n")
+            self.file.write("M=0\n")
+
+        elif total_vars <= ZERO_LOOP_THRESHOLD:
             self.file.write("@SP\n")
             self.file.write("A=M\n")
+            for i in range(total_vars):
+                if i:
+                    self.file.write("A=A+1\n")
+                self.file.write("M=0\n")
+            self.file.write("D=A+1\n")
+            self.file.write("@SP\n")
+            self.file.write("M=D\n")      # SP = past the last local
+
+        else:
+            loop = f"ZERO_{self.label_scope}{self.label_count}"
+            self.label_count += 1
+            self.file.write(f"@{total_vars}\n")
+            self.file.write("D=A\n")
+            self.file.write(f"({loop})\n")
+            self.file.write("D=D-1\n")
+            self.file.write("@SP\n")
+            self.file.write("A=D+M\n")    # A = SP + D
             self.file.write("M=0\n")
+            self.file.write(f"@{loop}\n")
+            self.file.write("D;JGT\n")
+            self.file.write(f"@{total_vars}\n")
+            self.file.write("D=A\n")
             self.file.write("@SP\n")
-            self.file.write("M=M+1\n")
+            self.file.write("M=D+M\n")    # SP += N
 
     def write_call(self, function_name, total_args):
         self.file.write(f"// call {function_name} {total_args}\n")
-        return_label = f"{function_name}$ret.{self.function_count}"
+        return_label = f"{function_name}$ret.{self.label_scope}{self.function_count}"
         self.function_count += 1
+
+        if self.compact:
+            # R13 = nArgs + 5, R14 = callee, D = return address
+            self.ensure_runtime()
+            self.compact_sites["call"] += 1
+            self.file.write(f"@{int(total_args) + 5}\n")
+            self.file.write("D=A\n")
+            self.file.write("@R13\n")
+            self.file.write("M=D\n")
+            self.file.write(f"@{function_name}\n")
+            self.file.write("D=A\n")
+            self.file.write("@R14\n")
+            self.file.write("M=D\n")
+            self.file.write(f"@{return_label}\n")
+            self.file.write("D=A\n")
+            self.file.write("@VM$CALL\n")
+            self.file.write("0;JMP\n")
+            self.file.write(f"({return_label})\n")
+            return
+
         for segment in [return_label, "LCL", "ARG", "THIS", "THAT"]:
             self.file.write(f"@{segment}\n")
             if segment == return_label:
@@ -311,6 +747,17 @@ class CodeWriter:
     def write_return(self):
         self.file.write("// return\n")
 
+        if self.compact:
+            self.ensure_runtime()
+            self.compact_sites["return"] += 1
+            self.file.write("@VM$RETURN\n")
+            self.file.write("0;JMP\n")
+            return
+
+        self._write_return_body()
+
+    def _write_return_body(self):
+
         # 1. FRAME = LCL (Store LCL in temporary variable R13)
         # We need this anchor because we will change LCL later.
         self.file.write("@LCL\n")
@@ -385,9 +832,161 @@ class CodeWriter:
         self.file.write("A=M\n")
         self.file.write("0;JMP\n")
 
+    def ensure_runtime(self):
+        """
+        Compact mode without a bootstrap (single .vm file): the shared
+        subroutines go in front of the first command that needs them,
+        behind a jump that skips over them.
+        """
+        if self.runtime_written:
+            return
+        self.runtime_written = True
+        self.file.write("@VM$START\n")
+        self.file.write("0;JMP\n")
+        marker = self.marker
+        self._write_runtime()
+        self.file.write("(VM$START)\n")
+        if marker:
+            # Back to the command that needed the runtime
+            self.file.write(marker)
+            self.marker = marker
+
+    def _write_runtime(self):
+        """
+        Writes the shared subroutines used by compact mode.
+        VM$CALL:   R13 = nArgs + 5, R14 = callee, D = return address
+        VM$RETURN: the regular return template, entered with a jump
+        VM$EQ/GT/LT: D = return address, result replaces the top two values
+        """
+        self.runtime_written = True
+        self.mark("<runtime>", 0, "VM$CALL", "call")
+        self._write_call_routine()
+
+        self.file.write("// Runtime: return\n")
+        self.mark("<runtime>", 0, "VM$RETURN", "return")
+        self.file.write("(VM$RETURN)\n")
+        self._write_return_body()
+
+        for command, jump in [("EQ", "JEQ"), ("GT", "JGT"), ("LT", "JLT")]:
+            self.mark("<runtime>", 0, f"VM${command}", command.lower())
+            self._write_compare_routine(command, jump)
+
+    def _write_call_routine(self):
+        self.file.write("// Runtime: call\n")
+        self.file.write("(VM$CALL)\n")
+        self.file.write("@SP\n")
+        self.file.write("A=M\n")
+        self.file.write("M=D\n")        # push return address
+        for segment in ["LCL", "ARG", "THIS", "THAT"]:
+            self.file.write(f"@{segment}\n")
+            self.file.write("D=M\n")
+            self.file.write("@SP\n")
+            self.file.write("AM=M+1\n")
+            self.file.write("M=D\n")    # push segment pointer
+        self.file.write("@SP\n")
+        self.file.write("MD=M+1\n")     # SP past the saved frame
+        self.file.write("@LCL\n")
+        self.file.write("M=D\n")        # LCL = SP
+        self.file.write("@R13\n")
+        self.file.write("D=D-M\n")
+        self.file.write("@ARG\n")
+        self.file.write("M=D\n")        # ARG = SP - nArgs - 5
+        self.file.write("@R14\n")
+        self.file.write("A=M\n")
+        self.file.write("0;JMP\n")      # goto callee
+
+    def _write_compare_routine(self, command, jump):
+        self.file.write(f"// Runtime: {command.lower()}\n")
+        self.file.write(f"(VM${command})\n")
+        self.file.write("@R15\n")
+        self.file.write("M=D\n")    # R15 = return address
+        self.file.write("@SP\n")
+        self.file.write("AM=M-1\n")
+        self.file.write("D=M\n")
+        self.file.write("A=A-1\n")
+        self.file.write("D=M-D\n")  # D = x - y
+        self.file.write("M=-1\n")   # assume true
+        self.file.write(f"@VM${command}_END\n")
+        self.file.write(f"D;{jump}\n")
+        self.file.write("@SP\n")
+        self.file.write("A=M-1\n")
+        self.file.write("M=0\n")    # false
+        self.file.write(f"(VM${command}_END)\n")
+        self.file.write("@R15\n")
+        self.file.write("A=M\n")
+        self.file.write("0;JMP\n")
+
+    def compact_tradeoff(self):
+        """
+        Measures what compact mode saves in ROM and costs in cycles.
+        Returns ({kind: (sites, ROM inline, ROM compact, cycles inline,
+        cycles compact)}, ROM of the shared routines) where ROM is per call
+        site and cycles are per executed command (longest path for
+        comparisons). The numbers come from emitting both versions of each
+        template and counting.
+        """
+        saved = (self.file, self.compact, self.runtime_written, self.top_in_d,
+                 self.label_count, self.function_count, dict(self.compact_sites))
+        self.top_in_d = False
+
+        def measure(emit, compact):
+            self.file = io.StringIO()
+            self.compact = compact
+            self.runtime_written = True
+            emit()
+            return sum(
+                1 for line in self.file.getvalue().splitlines()
+                if line and not line.startswith("//") and not line.startswith("(")
+            )
+
+        call_inline = measure(lambda: self.write_call("f", 0), False)
+        call_site = measure(lambda: self.write_call("f", 0), True)
+        call_routine = measure(self._write_call_routine, True)
+        return_inline = measure(self.write_return, False)
+        return_site = measure(self.write_return, True)
+        compare_inline = measure(lambda: self.write_arithmetic("eq"), False)
+        compare_site = measure(lambda: self.write_arithmetic("eq"), True)
+        # The false path runs through the whole routine
+        compare_routine = measure(lambda: self._write_compare_routine("EQ", "JEQ"), True)
+        runtime = measure(self._write_runtime, True)
+
+        (self.file, self.compact, self.runtime_written, self.top_in_d,
+         self.label_count, self.function_count, self.compact_sites) = saved
+
+        return {
+            # The inline templates run straight through, except a comparison
+            # whose false path skips the 3-instruction true block.
+            "call": (self.compact_sites["call"], call_inline, call_site,
+                     call_inline, call_site + call_routine),
+            "return": (self.compact_sites["return"], return_inline, return_site,
+                       return_inline, return_site + return_inline),
+            "compare": (self.compact_sites["compare"], compare_inline, compare_site,
+                        compare_inline - 3, compare_site + compare_routine),
+        }, runtime
+
+    def mark(self, file_name, line, function, command):
+        """
+        Writes a source map marker: the instructions that follow, up to the
+        next marker, come from this VM command.
+        """
+        if self.source_map:
+            self.marker = f"//# {file_name}:{line} {function or '-'} | {command}\n"
+            self.file.write(self.marker)
+
+    def write_fragment(self, assembly):
+        """
+        Appends assembly that was translated (and optimized) elsewhere.
+        """
+        self.spill()
+        self.file.write_raw(assembly)
+
     def set_file_name(self, file_name):
         self.filename = file_name.split('/')[-1].split('\\')[-1].replace('.vm', '') 
         
     def close(self):
         if self.file:
-            self.file.close()
\ No newline at end of file
+            # The stack is left in memory, where the final state is read
+            self.spill()
+            self.file.close()
+        if self.owns_stream:
+            self.stream.close()
\ No newline at end of file
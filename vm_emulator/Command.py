@@ -0,0 +1,41 @@
+from collections import namedtuple
+from CommandType import CommandType
+
+# One decoded VM command. arg1 is the arithmetic command itself for
+# ARITHMETIC and None for RETURN; arg2 is an int for PUSH, POP, FUNCTION
+# and CALL, None otherwise. arg3 is only used by the superinstructions
+# that VMOptimizer builds (see CommandType) and by inlined statics. line is
+# the source line, when the commands were read for a source map.
+Command = namedtuple("Command", ["type", "arg1", "arg2", "arg3", "line"], defaults=[None, None])
+
+KEYWORDS = {
+    CommandType.PUSH: "push",
+    CommandType.POP: "pop",
+    CommandType.LABEL: "label",
+    CommandType.GOTO: "goto",
+    CommandType.IF: "if-goto",
+    CommandType.FUNCTION: "function",
+    CommandType.CALL: "call",
+    CommandType.INCREMENT: "increment",
+}
+
+def format_command(command):
+    """
+    The VM text of a command (superinstructions get a readable form).
+    """
+    command_type = command.type
+    if command_type == CommandType.ARITHMETIC:
+        return command.arg1
+    if command_type == CommandType.RETURN:
+        return "return"
+    if command_type == CommandType.COMPARE:
+        return f"{command.arg1} {command.arg2}"
+    if command_type == CommandType.BRANCH:
+        constant = "" if command.arg3 is None else f" {command.arg3}"
+        return f"if-goto {command.arg1} on {command.arg2}{constant}"
+    if command_type == CommandType.INCREMENT:
+        return f"increment {command.arg1} {command.arg2} {command.arg3}"
+    parts = [KEYWORDS[command_type], command.arg1]
+    if command.arg2 is not None:
+        parts.append(str(command.arg2))
+    return " ".join(parts)
@@ -9,4 +9,12 @@ class CommandType(Enum):
     FUNCTION = 5
     RETURN = 6
     CALL = 7
-    LABEL = 8
\ No newline at end of file
+    LABEL = 8
+    # Superinstructions, built by VMOptimizer and never by the Parser:
+    # INCREMENT segment index delta   segment[index] += delta
+    # COMPARE   command constant      top = top eq/gt/lt constant
+    # BRANCH    label jump constant   pop x (and y) and jump if x - y
+    #                                 (or x - constant) satisfies jump
+    INCREMENT = 9
+    COMPARE = 10
+    BRANCH = 11
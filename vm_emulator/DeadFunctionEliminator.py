@@ -0,0 +1,92 @@
+from Parser import read_commands
+from CommandType import CommandType
+
+def keep_functions(commands, functions):
+    """
+    Yields the commands of the given functions, dropping every other
+    function from its function command up to the next one.
+    """
+    keep = True
+    for command in commands:
+        if command.type == CommandType.FUNCTION:
+            keep = command.arg1 in functions
+        if keep:
+            yield command
+
+class DeadFunctionEliminator:
+    """
+    Whole-program pass for directory mode: builds the call graph of the
+    program from its function and call commands, and keeps only the
+    functions reachable from the root (Sys.init, which the bootstrap calls).
+    VM code has no function pointers, so a function that is never named by
+    a reachable call can never run.
+    """
+
+    def __init__(self, root="Sys.init"):
+        self.root = root
+        self.calls = {}
+        self.files = {}
+        self.sizes = {}
+        self.reachable = set()
+
+    def analyze(self, vm_files):
+        """
+        Reads every file once for its function and call commands, then
+        walks the call graph from the root.
+        Returns False if the root is not defined (nothing can be removed).
+        """
+        for vm_file in vm_files:
+            function = None
+            with open(vm_file, 'r') as f:
+                for command in read_commands(f):
+                    if command.type == CommandType.FUNCTION:
+                        function = command.arg1
+                        self.calls[function] = set()
+                        self.files[function] = vm_file
+                        self.sizes[function] = 0
+                    elif function is None:
+                        continue
+                    elif command.type == CommandType.CALL:
+                        self.calls[function].add(command.arg1)
+                    self.sizes[function] += 1
+
+        if self.root not in self.calls:
+            self.reachable = set(self.calls)
+            return False
+
+        # Functions called but defined elsewhere (e.g. a built-in OS) are
+        # not followed
+        pending = [self.root]
+        self.reachable = {self.root}
+        while pending:
+            for callee in self.calls[pending.pop()]:
+                if callee in self.calls and callee not in self.reachable:
+                    self.reachable.add(callee)
+                    pending.append(callee)
+        return True
+
+    def removed(self):
+        return sorted(function for function in self.calls if function not in self.reachable)
+
+    def removed_commands(self):
+        return sum(self.sizes[function] for function in self.removed())
+
+    def kept_in(self, vm_file):
+        """
+        The reachable functions defined in one file (part of its cache key).
+        """
+        return sorted(function for function in self.reachable if self.files[function] == vm_file)
+
+    def filter(self, commands):
+        return keep_functions(commands, self.reachable)
+
+    def report(self, log=print):
+        removed = self.removed()
+        log(f"Dead functions: removed {len(removed)} of {len(self.calls)} "
+            f"({self.removed_commands()} VM commands)")
+        by_class = {}
+        for function in removed:
+            class_name, _, name = function.partition('.')
+            by_class.setdefault(class_name, []).append(name)
+        for class_name, names in by_class.items():
+            log(f"   {class_name}: {', '.join(names)}")
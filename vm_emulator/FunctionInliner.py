@@ -0,0 +1,159 @@
+import os
+import hashlib
+from Parser import read_commands
+from Command import Command
+from CommandType import CommandType
+
+# Largest body (in VM commands, without function/return) inlined by default
+DEFAULT_MAX_SIZE = 10
+
+UNARY = {"neg", "not"}
+
+class FunctionInliner:
+    """
+    Replaces calls to small leaf functions with their bodies.
+    A function is inlined when its body is straight-line code (no calls,
+    labels or jumps) of at most max_size commands, ending with the only
+    return and exactly one value on its stack.
+    At the call site the callee's arguments, locals and saved THIS/THAT
+    become extra locals of the caller, so the body's argument and local
+    accesses are rewritten against the caller's frame. The callee's statics
+    keep the callee's file name (carried in arg3 of the static push/pop).
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        # name -> (file name, number of locals, body, pointers written)
+        self.functions = {}
+        self.sites = 0
+
+    def analyze(self, vm_files):
+        """
+        Finds the inlinable functions of the whole program.
+        """
+        for vm_file in vm_files:
+            file_name = os.path.basename(vm_file).replace('.vm', '')
+            header, body = None, []
+            with open(vm_file, 'r') as f:
+                for command in read_commands(f):
+                    if command.type == CommandType.FUNCTION:
+                        self._consider(file_name, header, body)
+                        header, body = command, []
+                    else:
+                        body.append(command)
+            self._consider(file_name, header, body)
+
+    def _consider(self, file_name, header, commands):
+        if header is None or not commands or commands[-1].type != CommandType.RETURN:
+            return
+        body = commands[:-1]
+        if len(body) > self.max_size:
+            return
+
+        depth = 0
+        pointers = set()
+        for command in body:
+            if command.type == CommandType.PUSH:
+                depth += 1
+            elif command.type == CommandType.POP:
+                depth -= 1
+                if command.arg1 == "pointer":
+                    pointers.add(command.arg2)
+            elif command.type == CommandType.ARITHMETIC:
+                needed = 1 if command.arg1 in UNARY else 2
+                if depth < needed:
+                    return
+                depth -= needed - 1
+            else:
+                return
+            if depth < 0:
+                return
+        if depth != 1:
+            return
+        self.functions[header.arg1] = (file_name, header.arg2, body, sorted(pointers))
+
+    def signature(self):
+        """
+        Hash of everything inlining depends on (part of the fragment cache
+        key, since a fragment then contains code from other files).
+        """
+        digest = hashlib.sha256(f"max_size={self.max_size}".encode())
+        for name in sorted(self.functions):
+            digest.update(repr((name, self.functions[name])).encode())
+        return digest.hexdigest()[:16]
+
+    def inline(self, commands, file_name):
+        """
+        Yields the commands of one file with the calls to inlinable functions
+        expanded. Commands are buffered one function at a time, since the
+        function command must reserve the extra locals.
+        """
+        header, body = None, []
+        for command in commands:
+            if command.type == CommandType.FUNCTION:
+                yield from self._expand(header, body, file_name)
+                header, body = command, []
+            else:
+                body.append(command)
+        yield from self._expand(header, body, file_name)
+
+    def _expand(self, header, body, file_name):
+        if header is None:
+            # Code outside any function has no locals to borrow
+            yield from body
+            return
+
+        base = header.arg2
+        extra = 0
+        for command in body:
+            if command.type == CommandType.CALL and command.arg1 in self.functions:
+                _, total_locals, _, pointers = self.functions[command.arg1]
+                extra = max(extra, command.arg2 + total_locals + len(pointers))
+
+        yield header._replace(arg2=base + extra)
+        for command in body:
+            if command.type == CommandType.CALL and command.arg1 in self.functions:
+                self.sites += 1
+                # The inlined code is attributed to the call (see SourceMap)
+                for inlined in self._site(command.arg2, base, file_name,
+                                          *self.functions[command.arg1]):
+                    yield inlined._replace(line=command.line)
+            else:
+                yield command
+
+    def _site(self, total_args, base, caller_file, callee_file, total_locals, body, pointers):
+        """
+        The inlined body of one call. The caller's locals from base on hold
+        the arguments, then the callee's locals, then the saved pointers.
+        """
+        PUSH, POP = CommandType.PUSH, CommandType.POP
+        first_local = base + total_args
+        first_saved = first_local + total_locals
+
+        for i in reversed(range(total_args)):
+            yield Command(POP, "local", base + i)
+        for i, pointer in enumerate(pointers):
+            yield Command(PUSH, "pointer", pointer)
+            yield Command(POP, "local", first_saved + i)
+        for i in range(total_locals):
+            yield Command(PUSH, "constant", 0)
+            yield Command(POP, "local", first_local + i)
+
+        for command in body:
+            if command.type in (PUSH, POP):
+                if command.arg1 == "argument":
+                    command = Command(command.type, "local", base + command.arg2)
+                elif command.arg1 == "local":
+                    command = Command(command.type, "local", first_local + command.arg2)
+                elif command.arg1 == "static" and callee_file != caller_file:
+                    command = Command(command.type, "static", command.arg2, callee_file)
+            yield command
+
+        # The return value stays on top of the stack
+        for i, pointer in enumerate(pointers):
+            yield Command(PUSH, "local", first_saved + i)
+            yield Command(POP, "pointer", pointer)
+
+    def report(self, log=print):
+        log(f"Inliner: {self.sites} call sites inlined ({len(self.functions)} leaf "
+            f"functions of at most {self.max_size} commands qualify)")
@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import argparse
+from functools import lru_cache
+
+# Same tables as assembly/Code.java, as integers
+DEST = {
+    "": 0b000, "M": 0b001, "D": 0b010, "MD": 0b011,
+    "A": 0b100, "AM": 0b101, "AD": 0b110, "AMD": 0b111,
+}
+
+COMP = {
+    "0": 0b0101010, "1": 0b0111111, "-1": 0b0111010,
+    "D": 0b0001100, "A": 0b0110000, "!D": 0b0001101, "!A": 0b0110001,
+    "-D": 0b0001111, "-A": 0b0110011, "D+1": 0b0011111, "A+1": 0b0110111,
+    "D-1": 0b0001110, "A-1": 0b0110010, "D+A": 0b0000010, "D-A": 0b0010011,
+    "A-D": 0b0000111, "D&A": 0b0000000, "D|A": 0b0010101,
+    "M": 0b1110000, "!M": 0b1110001, "-M": 0b1110011, "M+1": 0b1110111,
+    "M-1": 0b1110010, "D+M": 0b1000010, "D-M": 0b1010011, "M-D": 0b1000111,
+    "D&M": 0b1000000, "D|M": 0b1010101,
+}
+
+JUMP = {
+    "": 0b000, "JGT": 0b001, "JEQ": 0b010, "JGE": 0b011,
+    "JLT": 0b100, "JNE": 0b101, "JLE": 0b110, "JMP": 0b111,
+}
+
+# Same symbols as assembly/SymbolTable.java
+PREDEFINED_SYMBOLS = {f"R{i}": i for i in range(16)}
+PREDEFINED_SYMBOLS.update({
+    "SP": 0, "LCL": 1, "ARG": 2, "THIS": 3, "THAT": 4,
+    "SCREEN": 16384, "KBD": 24576,
+})
+
+FIRST_VARIABLE = 16
+
+C_PATTERN = re.compile(r"^(?:([AMD]+)=)?([^;]+)(?:;(\w+))?$")
+
+# Source map marker comments (see CodeWriter.mark)
+MARKER_PREFIX = "//#"
+
+@lru_cache(maxsize=None)
+def encode_computation(instruction):
+    """
+    Encodes one C-instruction. Generated code repeats the same few dozen
+    instructions, so each distinct one is parsed only once.
+    """
+    match = C_PATTERN.match(instruction.replace(" ", ""))
+    if not match:
+        raise ValueError(f"Invalid instruction: {instruction}")
+    dest, comp, jump = match.group(1) or "", match.group(2), match.group(3) or ""
+    try:
+        return (0b111 << 13) | (COMP[comp] << 6) | (DEST[dest] << 3) | JUMP[jump]
+    except KeyError:
+        raise ValueError(f"Invalid instruction: {instruction}")
+
+class HackAssembler:
+    """
+    Two-pass Hack assembler, the Python counterpart of assembly/.
+    1. First pass: labels get the ROM address of the next instruction;
+       numeric A-instructions and C-instructions are encoded right away
+    2. Second pass: only the symbolic A-instructions are left; they are
+       resolved in program order, so new variables get RAM addresses from
+       16 on in order of first use
+    Instructions are returned as 16-bit integers.
+    The assembler can also be written to like an output file: text given
+    to write() goes through the first pass as it arrives, so CodeWriter
+    can translate straight into it and finish() returns the machine code
+    without an .asm file in between. With markers=True the source map
+    markers are kept as (ROM address, comment) pairs.
+    """
+
+    def __init__(self, markers=False):
+        self.symbols = dict(PREDEFINED_SYMBOLS)
+        # ROM labels only (symbols also holds variables)
+        self.labels = {}
+        self.next_variable = FIRST_VARIABLE
+        self.instructions = []
+        # (index in instructions, symbol) of the A-instructions to resolve
+        self.unresolved = []
+        self.markers = [] if markers else None
+        # Text after the last newline given to write()
+        self.partial = ""
+
+    def assemble(self, lines):
+        for line in lines:
+            self._first_pass(line)
+        return self.finish()
+
+    def write(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self._first_pass(line)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        """
+        Runs the second pass. Returns the encoded instructions.
+        """
+        if self.partial:
+            self._first_pass(self.partial)
+            self.partial = ""
+        instructions = self.instructions
+        for index, symbol in self.unresolved:
+            instructions[index] = self._address(symbol)
+        self.unresolved = []
+        return instructions
+
+    def _first_pass(self, line):
+        if line.startswith("//"):
+            if self.markers is not None and line.startswith(MARKER_PREFIX):
+                self.markers.append((len(self.instructions), line.strip()))
+            return
+        line = line.split('//')[0].strip()
+        if not line:
+            return
+        first = line[0]
+        if first == "(":
+            self.symbols[line[1:-1]] = len(self.instructions)
+            self.labels[line[1:-1]] = len(self.instructions)
+        elif first == "@":
+            symbol = line[1:]
+            if symbol.isdigit():
+                self.instructions.append(int(symbol))
+            else:
+                self.unresolved.append((len(self.instructions), symbol))
+                self.instructions.append(None)
+        else:
+            self.instructions.append(encode_computation(line))
+
+    def _address(self, symbol):
+        if symbol not in self.symbols:
+            self.symbols[symbol] = self.next_variable
+            self.next_variable += 1
+        return self.symbols[symbol]
+
+@lru_cache(maxsize=None)
+def binary(instruction):
+    return format(instruction, "016b")
+
+def to_binary(instructions):
+    """
+    Formats encoded instructions as the lines of a .hack file.
+    """
+    return [binary(instruction) for instruction in instructions]
+
+class Fragment:
+    """
+    A piece of a program, first-passed once and linked as often as needed
+    (see link): its .hack lines, with None for the symbolic A-instructions,
+    its labels (relative to its start) and the symbols it uses that it
+    does not define, in order of first use.
+    """
+
+    def __init__(self, text):
+        assembler = HackAssembler()
+        # The newline ends a last line left without one
+        assembler.write(text + "\n")
+        self.size = len(assembler.instructions)
+        self.labels = assembler.labels
+        self.unresolved = assembler.unresolved
+        self.lines = [None if instruction is None else binary(instruction)
+                      for instruction in assembler.instructions]
+        self.external = list(dict.fromkeys(
+            symbol for _, symbol in self.unresolved if symbol not in self.labels))
+        # (offset, addresses of external) -> lines of the last link
+        self.resolved = (None, None)
+
+def link(fragments):
+    """
+    Joins fragments into the lines of one .hack file. Symbols resolve as
+    in HackAssembler.finish over the joined text (labels of a fragment
+    refer to its own code), with variables numbered in order of first
+    use. A fragment whose offset and external symbol addresses are those
+    of its last link is reused without resolving it again.
+    """
+    symbols = dict(PREDEFINED_SYMBOLS)
+    offsets = []
+    offset = 0
+    for fragment in fragments:
+        offsets.append(offset)
+        for label, address in fragment.labels.items():
+            symbols[label] = address + offset
+        offset += fragment.size
+
+    next_variable = FIRST_VARIABLE
+    lines = []
+    for fragment, offset in zip(fragments, offsets):
+        addresses = []
+        for symbol in fragment.external:
+            if symbol not in symbols:
+                symbols[symbol] = next_variable
+                next_variable += 1
+            addresses.append(symbols[symbol])
+        key = (offset, tuple(addresses))
+        if fragment.resolved[0] != key:
+            local = dict(zip(fragment.external, addresses))
+            for label, address in fragment.labels.items():
+                local[label] = address + offset
+            resolved = fragment.lines.copy()
+            for index, symbol in fragment.unresolved:
+                resolved[index] = binary(local[symbol])
+            fragment.resolved = (key, resolved)
+        lines += fragment.resolved[1]
+    return lines
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python HackAssembler.py <program.asm> [-o program.hack]",
+        description="Assembles a Hack .asm file into a .hack file."
+    )
+    arg_parser.add_argument("program", help="a .asm file")
+    arg_parser.add_argument("-o", "--output", help="output .hack file (default: next to the input)")
+    args = arg_parser.parse_args()
+
+    output = args.output or os.path.splitext(args.program)[0] + ".hack"
+    try:
+        with open(args.program, 'r') as f:
+            instructions = HackAssembler().assemble(f)
+    except (OSError, ValueError) as error:
+        print(f"❌ Error: {error}")
+        sys.exit(1)
+    with open(output, 'w') as f:
+        f.write("\n".join(to_binary(instructions)) + "\n")
+    print(f"✅ Done! {len(instructions)} instructions written to: {output}")
+
+if __name__ == "__main__":
+    main()
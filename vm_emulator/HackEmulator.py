@@ -0,0 +1,412 @@
+import time
+import argparse
+from array import array
+from HackAssembler import HackAssembler, PREDEFINED_SYMBOLS
+
+RAM_SIZE = 32768
+ADDRESS_MASK = RAM_SIZE - 1
+WORD_MASK = 0xFFFF
+SIGN_BIT = 0x8000
+
+# ALU functions by the 7 comp bits (a c1..c6); registers hold unsigned
+# 16-bit values and every result is masked back to 16 bits.
+COMP_FUNCTIONS = {
+    0b0101010: lambda a, d, m: 0,
+    0b0111111: lambda a, d, m: 1,
+    0b0111010: lambda a, d, m: WORD_MASK,
+    0b0001100: lambda a, d, m: d,
+    0b0110000: lambda a, d, m: a,
+    0b0001101: lambda a, d, m: ~d,
+    0b0110001: lambda a, d, m: ~a,
+    0b0001111: lambda a, d, m: -d,
+    0b0110011: lambda a, d, m: -a,
+    0b0011111: lambda a, d, m: d + 1,
+    0b0110111: lambda a, d, m: a + 1,
+    0b0001110: lambda a, d, m: d - 1,
+    0b0110010: lambda a, d, m: a - 1,
+    0b0000010: lambda a, d, m: d + a,
+    0b0010011: lambda a, d, m: d - a,
+    0b0000111: lambda a, d, m: a - d,
+    0b0000000: lambda a, d, m: d & a,
+    0b0010101: lambda a, d, m: d | a,
+    0b1110000: lambda a, d, m: m,
+    0b1110001: lambda a, d, m: ~m,
+    0b1110011: lambda a, d, m: -m,
+    0b1110111: lambda a, d, m: m + 1,
+    0b1110010: lambda a, d, m: m - 1,
+    0b1000010: lambda a, d, m: d + m,
+    0b1010011: lambda a, d, m: d - m,
+    0b1000111: lambda a, d, m: m - d,
+    0b1000000: lambda a, d, m: d & m,
+    0b1010101: lambda a, d, m: d | m,
+}
+
+# Jump taken? by the 3 jump bits, indexed by the ALU output:
+# 0 = zero, 1 = negative, 2 = positive
+JUMP_CONDITIONS = {
+    0b001: (False, False, True),    # JGT
+    0b010: (True, False, False),    # JEQ
+    0b011: (True, False, True),     # JGE
+    0b100: (False, True, False),    # JLT
+    0b101: (False, True, True),     # JNE
+    0b110: (True, True, False),     # JLE
+    0b111: (True, True, True),      # JMP
+}
+
+# The same ALU functions as Python expressions, for compiled blocks.
+# "m" is replaced by the RAM access of the current A register.
+COMP_EXPRESSIONS = {
+    0b0101010: "0", 0b0111111: "1", 0b0111010: "65535",
+    0b0001100: "d", 0b0110000: "a", 0b0001101: "~d", 0b0110001: "~a",
+    0b0001111: "-d", 0b0110011: "-a", 0b0011111: "d + 1", 0b0110111: "a + 1",
+    0b0001110: "d - 1", 0b0110010: "a - 1", 0b0000010: "d + a",
+    0b0010011: "d - a", 0b0000111: "a - d", 0b0000000: "d & a",
+    0b0010101: "d | a",
+    0b1110000: "m", 0b1110001: "~m", 0b1110011: "-m", 0b1110111: "m + 1",
+    0b1110010: "m - 1", 0b1000010: "d + m", 0b1010011: "d - m",
+    0b1000111: "m - d", 0b1000000: "d & m", 0b1010101: "d | m",
+}
+
+# Results that never leave the 16-bit range and need no mask
+UNMASKED_EXPRESSIONS = {"0", "1", "65535", "d", "a", "m", "d & a", "d & m", "d | a", "d | m"}
+
+# The jump conditions as Python expressions over the result v
+JUMP_EXPRESSIONS = {
+    0b001: "0 < v < 32768",
+    0b010: "v == 0",
+    0b011: "v < 32768",
+    0b100: "v >= 32768",
+    0b101: "v != 0",
+    0b110: "v == 0 or v >= 32768",
+    0b111: "True",
+}
+
+# Longest straight-line run compiled into one block
+MAX_BLOCK_LENGTH = 256
+
+def decode(instruction):
+    """
+    Pre-decodes one 16-bit instruction into a tuple:
+    A-instruction: (False, value)
+    C-instruction: (True, comp function, reads M, dest A, dest D, dest M,
+                    jump conditions or None)
+    """
+    if not instruction & SIGN_BIT:
+        return (False, instruction)
+    comp = (instruction >> 6) & 0b1111111
+    if comp not in COMP_FUNCTIONS:
+        raise ValueError(f"Invalid instruction: {instruction:016b}")
+    dest = (instruction >> 3) & 0b111
+    jump = instruction & 0b111
+    return (
+        True,
+        COMP_FUNCTIONS[comp],
+        bool(comp & 0b1000000),
+        bool(dest & 0b100),
+        bool(dest & 0b010),
+        bool(dest & 0b001),
+        JUMP_CONDITIONS.get(jump),
+    )
+
+def find_halts(instructions):
+    """
+    Returns the ROM addresses of halt loops: "@X" at address X directly
+    followed by an unconditional jump, i.e. (END) @END 0;JMP.
+    """
+    halts = set()
+    for address in range(1, len(instructions)):
+        previous = instructions[address - 1]
+        current = instructions[address]
+        if current & SIGN_BIT and current & 0b111 == 0b111 and previous == address - 1:
+            halts.add(address - 1)
+    return halts
+
+def load_program(path):
+    """
+    Returns the 16-bit instructions of a .hack or .asm file.
+    """
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    if path.endswith(".hack"):
+        return [int(line.strip(), 2) for line in lines if line.strip()]
+    return HackAssembler().assemble(lines)
+
+def compile_block(instructions, start, end):
+    """
+    Compiles the instructions in ROM[start:end] into one Python function
+    block(ram, a, d) -> (a, d, next pc). Only the last instruction may jump.
+    RAM accesses use a literal address whenever A holds a constant loaded
+    earlier in the block.
+    """
+    body = []
+    known_a = None
+    next_pc = str(end)
+    for address in range(start, end):
+        instruction = instructions[address]
+        if not instruction & SIGN_BIT:
+            body.append(f"a = {instruction}")
+            known_a = instruction
+            continue
+
+        comp = (instruction >> 6) & 0b1111111
+        dest = (instruction >> 3) & 0b111
+        jump = instruction & 0b111
+        memory = f"ram[{known_a & ADDRESS_MASK}]" if known_a is not None else "ram[a & 32767]"
+
+        expression = COMP_EXPRESSIONS[comp]
+        if expression not in UNMASKED_EXPRESSIONS:
+            expression = f"({expression}) & 65535"
+        body.append(f"v = {expression.replace('m', memory)}")
+        if jump:
+            body.append("t = a")
+        if dest & 0b001:
+            body.append(f"{memory} = v")
+        if dest & 0b100:
+            body.append("a = v")
+            known_a = None
+        if dest & 0b010:
+            body.append("d = v")
+        if jump:
+            next_pc = f"t if {JUMP_EXPRESSIONS[jump]} else {end}"
+
+    source = "def block(ram, a, d):\n"
+    source += "".join(f"    {line}\n" for line in body)
+    source += f"    return a, d, {next_pc}\n"
+    namespace = {}
+    exec(source, namespace)
+    return namespace["block"]
+
+class HackEmulator:
+    """
+    Headless Hack computer. The ROM is pre-decoded once into dispatch
+    tuples, RAM is a flat array of unsigned 16-bit words, and every
+    executed instruction counts as one cycle.
+    With compiled=True, straight-line runs of the ROM (basic blocks, cut
+    after a jump and before a halt loop) are compiled on first use into
+    one generated Python function each and cached by start address.
+    """
+
+    def __init__(self, instructions, compiled=True):
+        self.compiled = compiled
+        self.watched = set()
+        self.on_watch = None
+        self.load(instructions)
+
+    def load(self, instructions):
+        self.instructions = list(instructions)
+        self.program = [decode(instruction) for instruction in self.instructions]
+        self.halts = find_halts(self.instructions)
+        self.blocks = {}
+        self.reset()
+
+    def set_instruction(self, address, instruction):
+        """
+        Replaces one ROM instruction and drops every compiled block that
+        contains it.
+        """
+        self.instructions[address] = instruction
+        self.program[address] = decode(instruction)
+        halts = find_halts(self.instructions)
+        if halts != self.halts:
+            # Blocks are cut before halt loops, so any of them may be stale
+            self.halts = halts
+            self.blocks = {}
+            return
+        self.blocks = {
+            start: block for start, block in self.blocks.items()
+            if not start <= address < start + block[1]
+        }
+
+    def watch(self, addresses, callback):
+        """
+        Calls callback(address, cycles so far) whenever execution reaches
+        one of the ROM addresses, before the instruction there runs.
+        Compiled blocks are also cut before these addresses, so code that
+        falls through into one is seen as well.
+        """
+        self.watched = set(addresses)
+        self.on_watch = callback
+        self.blocks = {}
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_program(path))
+
+    def reset(self):
+        self.ram = array('H', bytes(2 * RAM_SIZE))
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, max_cycles=None):
+        """
+        Runs until a halt loop, the end of the ROM, or max_cycles more
+        cycles. Returns the number of cycles executed by this call.
+        """
+        if self.compiled:
+            return self._run_blocks(max_cycles)
+        return self._run_interpreted(max_cycles)
+
+    def _run_blocks(self, max_cycles):
+        blocks = self.blocks
+        ram = self.ram
+        halts = self.halts
+        watched = self.watched
+        size = len(self.program)
+        a, d, pc = self.a, self.d, self.pc
+        limit = float('inf') if max_cycles is None else max_cycles
+        cycles = 0
+
+        while True:
+            if pc in halts or pc >= size:
+                self.halted = True
+                break
+            entry = blocks.get(pc)
+            if entry is None:
+                entry = blocks[pc] = self._compile_block(pc)
+            block, length = entry
+            if cycles + length > limit:
+                # Not enough cycles left for the whole block: finish exactly
+                self.a, self.d, self.pc = a, d, pc
+                self.cycles += cycles
+                return cycles + self._run_interpreted(limit - cycles)
+            if pc in watched:
+                self.on_watch(pc, self.cycles + cycles)
+            a, d, pc = block(ram, a, d)
+            cycles += length
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += cycles
+        return cycles
+
+    def _compile_block(self, start):
+        end = start
+        size = len(self.instructions)
+        while end < size and end - start < MAX_BLOCK_LENGTH:
+            instruction = self.instructions[end]
+            end += 1
+            if instruction & SIGN_BIT and instruction & 0b111:
+                break
+            if end in self.halts or end in self.watched:
+                break
+        return compile_block(self.instructions, start, end), end - start
+
+    def _run_interpreted(self, max_cycles):
+        program = self.program
+        ram = self.ram
+        halts = self.halts
+        watched = self.watched
+        size = len(program)
+        a, d, pc = self.a, self.d, self.pc
+        limit = float('inf') if max_cycles is None else max_cycles
+        cycles = 0
+
+        while cycles < limit:
+            if pc in halts or pc >= size:
+                self.halted = True
+                break
+            if pc in watched:
+                self.on_watch(pc, self.cycles + cycles)
+            op = program[pc]
+            cycles += 1
+            if not op[0]:
+                a = op[1]
+                pc += 1
+                continue
+
+            _, comp, reads_m, dest_a, dest_d, dest_m, jump = op
+            value = comp(a, d, ram[a & ADDRESS_MASK] if reads_m else 0) & WORD_MASK
+            if dest_m:
+                ram[a & ADDRESS_MASK] = value
+            # The jump target is the A register before this instruction
+            if jump and jump[0 if value == 0 else (1 if value & SIGN_BIT else 2)]:
+                pc = a
+            else:
+                pc += 1
+            if dest_a:
+                a = value
+            if dest_d:
+                d = value
+
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += cycles
+        return cycles
+
+    def peek(self, address):
+        """
+        Returns RAM[address] as a signed value.
+        """
+        value = self.ram[address]
+        return value - 0x10000 if value & SIGN_BIT else value
+
+    def poke(self, address, value):
+        self.ram[address] = value & WORD_MASK
+
+BENCHMARK_CYCLES = 5_000_000
+
+def benchmark(emulator, cycles):
+    """
+    Runs the same program with the interpreter and with compiled blocks,
+    from the same initial RAM, and prints instructions per second.
+    """
+    initial_ram = array('H', emulator.ram)
+    results = {}
+    for compiled in (False, True):
+        emulator.compiled = compiled
+        emulator.reset()
+        emulator.ram[:] = initial_ram
+        start = time.perf_counter()
+        emulator.run(cycles)
+        elapsed = time.perf_counter() - start
+        results[compiled] = emulator.cycles / elapsed
+        mode = "compiled blocks" if compiled else "interpreter"
+        print(f"{mode:16} {emulator.cycles:10} cycles  {elapsed:7.3f} s  "
+              f"{results[compiled] / 1e6:6.2f} M instructions/s")
+    print(f"speedup: {results[True] / results[False]:.1f}x "
+          f"({len(emulator.blocks)} blocks compiled)")
+
+def parse_address(text):
+    return PREDEFINED_SYMBOLS[text] if text in PREDEFINED_SYMBOLS else int(text)
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python HackEmulator.py [options] <program.asm|program.hack>",
+        description="Runs a Hack program headless and reports the cycle count."
+    )
+    arg_parser.add_argument("program", help="a .asm or .hack file")
+    arg_parser.add_argument("-n", "--cycles", type=int,
+                            help="stop after N cycles (default: run until a halt loop)")
+    arg_parser.add_argument("--set", action="append", default=[], metavar="ADDR=VALUE",
+                            help="initial RAM value, e.g. --set R0=6 (repeatable)")
+    arg_parser.add_argument("--interpret", action="store_true",
+                            help="run instruction by instruction, without compiling blocks")
+    arg_parser.add_argument("--benchmark", action="store_true",
+                            help="compare interpreter and compiled blocks in instructions per second")
+    arg_parser.add_argument("--ram", action="append", default=[], metavar="ADDR[-ADDR]",
+                            help="RAM cell or range to print after the run (repeatable)")
+    args = arg_parser.parse_args()
+
+    emulator = HackEmulator(load_program(args.program), compiled=not args.interpret)
+    for assignment in args.set:
+        address, value = assignment.split("=")
+        emulator.poke(parse_address(address), int(value))
+
+    if args.benchmark:
+        benchmark(emulator, args.cycles or BENCHMARK_CYCLES)
+        return
+
+    emulator.run(args.cycles)
+    status = "halted" if emulator.halted else "stopped"
+    print(f"{status} after {emulator.cycles} cycles (pc={emulator.pc})")
+
+    for cells in args.ram:
+        first, _, last = cells.partition("-")
+        first = parse_address(first)
+        last = parse_address(last) if last else first
+        for address in range(first, last + 1):
+            print(f"RAM[{address}] = {emulator.peek(address)}")
+
+if __name__ == "__main__":
+    main()
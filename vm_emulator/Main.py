@@ -1,89 +1,298 @@
 import sys
 import os
-from Parser import Parser
+import argparse
+from Parser import Parser, read_commands
 from CodeWriter import CodeWriter
 from CommandType import CommandType
+from PeepholeOptimizer import PeepholeOptimizer
+from ParallelTranslator import ParallelTranslator
+from DeadFunctionEliminator import DeadFunctionEliminator
+from VMOptimizer import VMOptimizer
+from FunctionInliner import FunctionInliner, DEFAULT_MAX_SIZE
+from SourceMap import SourceMap
+from HackAssembler import HackAssembler, to_binary
+from TranslationCache import TranslationCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(
+        usage="python Main.py [options] [input_path]",
+        description="Translates a .vm file or a directory of .vm files into Hack assembly. "
+                    "Without an input path (or with '-') it reads VM code from stdin and "
+                    "writes assembly to stdout, e.g. cat *.vm | VMtranslator > out.asm"
+    )
+    arg_parser.add_argument("input_path", nargs="?", default="-",
+                            help="a .vm file, a directory of .vm files, or '-' for stdin")
+    arg_parser.add_argument("-o", "--output",
+                            help="output .asm (or .hack) file, or '-' for stdout")
+    arg_parser.add_argument("-b", "--binary", action="store_true",
+                            help="assemble in the same process and write the .hack machine "
+                                 "code, without an .asm file (implied by -o Xxx.hack)")
+    arg_parser.add_argument("-s", "--stream", action="store_true",
+                            help="read .vm files line by line instead of loading them first "
+                                 "(directories: no cache and no -j, to keep memory bounded)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="translate the files of a directory in N parallel processes")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="do not reuse or store translated fragments of unchanged files")
+    arg_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                            help="where translated fragments are cached")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="cache size limit in MB (least recently used entries go first)")
+    arg_parser.add_argument("--no-bootstrap", action="store_true",
+                            help="do not write the bootstrap code (SP=256, call Sys.init)")
+    arg_parser.add_argument("-O", "--optimize", action="store_true",
+                            help="run the peephole optimizer over the generated assembly")
+    arg_parser.add_argument("-c", "--compact", action="store_true",
+                            help="use shared call/return/compare subroutines to save ROM")
+    arg_parser.add_argument("-d", "--dead-functions", action="store_true",
+                            help="directory mode: drop functions unreachable from Sys.init")
+    arg_parser.add_argument("-V", "--vm-optimize", action="store_true",
+                            help="fold constants and fuse common VM command sequences "
+                                 "before code generation")
+    arg_parser.add_argument("-t", "--cache-top", action="store_true",
+                            help="keep the top of the stack in the D register between commands")
+    arg_parser.add_argument("-i", "--inline", action="store_true",
+                            help="inline calls to small leaf functions")
+    arg_parser.add_argument("--inline-size", type=int, default=DEFAULT_MAX_SIZE,
+                            help="largest function body (in VM commands) that is inlined; "
+                                 "larger trades ROM for speed")
+    arg_parser.add_argument("-m", "--source-map", action="store_true",
+                            help="write a map from ROM addresses to VM file, line, function "
+                                 "and command next to the .asm file")
+    arg_parser.add_argument("--map-format", choices=["json", "binary"], default="json",
+                            help="source map format: Xxx.map.json or the compact binary Xxx.map")
+    return arg_parser.parse_args()
+
+def print_compact_tradeoff(tradeoff, runtime, log=print):
+    """
+    Prints the ROM saved and cycles added by compact mode, per command kind.
+    """
+    log("\nCompact mode trade-off (per site ROM, per execution cycles):")
+    total_saved = 0
+    for kind, (sites, rom_inline, rom_compact, cycles_inline, cycles_compact) in tradeoff.items():
+        saved = sites * (rom_inline - rom_compact)
+        total_saved += saved
+        log(f"   {kind:8} {sites:5} sites   ROM {rom_inline:3} -> {rom_compact:2} "
+            f"(saved {saved})   cycles {cycles_inline:3} -> {cycles_compact:3} "
+            f"({cycles_compact - cycles_inline:+d})")
+    log(f"   Shared routines: {runtime} instructions")
+    log(f"   Net ROM saved: {total_saved - runtime} instructions")
+
+def translate_stdin(code_writer, vm_optimizer=None, numbered=False):
+    """
+    Streams VM code from stdin. The file boundaries of a concatenated
+    stream are lost, so statics are scoped by the class name of the
+    current function (Xxx.vm only defines Xxx.* functions). Line numbers
+    are those of the whole stream.
+    """
+    commands = read_commands(sys.stdin, numbered)
+    if vm_optimizer:
+        commands = vm_optimizer.optimize(commands)
+    for command in commands:
+        if command.type == CommandType.FUNCTION:
+            code_writer.set_file_name(command.arg1.split('.')[0])
+        code_writer.write_command(command)
+
+def write_hack(output_file, instructions):
+    lines = "\n".join(to_binary(instructions)) + "\n"
+    if output_file == "-":
+        sys.stdout.write(lines)
+        return
+    with open(output_file, 'w') as f:
+        f.write(lines)
+
+def write_source_map(output_file, map_format, log=print, assembler=None):
+    """
+    Builds the source map from the markers in the written .asm file, or
+    the ones the in-process assembler kept.
+    """
+    if output_file == "-":
+        log("Source map: not written for stdout (the markers are in the assembly).")
+        return
+    if assembler:
+        source_map = SourceMap.from_markers(assembler.markers, len(assembler.instructions))
+    else:
+        with open(output_file, 'r') as f:
+            source_map = SourceMap.from_assembly(f)
+    extension = ".map.json" if map_format == "json" else ".map"
+    map_file = os.path.splitext(output_file)[0] + extension
+    source_map.save(map_file)
+    log(f"Source map: {len(source_map)} ranges over {source_map.size} instructions "
+        f"written to {map_file}")
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python Main.py <input_path>")
-        sys.exit(1)
+    args = parse_args()
 
-    input_path = sys.argv[1].strip().strip('"').strip("'")
-    
-    if not os.path.exists(input_path):
+    input_path = args.input_path.strip().strip('"').strip("'")
+    from_stdin = input_path == "-"
+    output_file = args.output
+
+    # Progress goes to stderr whenever the assembly itself goes to stdout
+    to_stdout = output_file == "-" or (from_stdin and output_file is None)
+    log = (lambda *message: print(*message, file=sys.stderr)) if to_stdout else print
+
+    files_to_translate = []
+    default_output = ""
+
+    if from_stdin:
+        # A concatenation of .vm files: bootstrap it like a directory
+        default_output = "-"
+        files_to_translate = ["-"]
+        write_bootstrap = True
+
+    elif not os.path.exists(input_path):
         print(f"\n❌ Error: The path '{input_path}' does not exist.")
         print(f"   Python looked in: {os.path.abspath(input_path)}")
         print("   Please check the path and try again.\n")
         sys.exit(1)
 
-    files_to_translate = []
-    output_file = ""
-
-    if os.path.isdir(input_path):
+    elif os.path.isdir(input_path):
         dir_name = os.path.basename(os.path.normpath(input_path))
-        output_file = os.path.join(input_path, dir_name + ".asm")
+        default_output = os.path.join(input_path, dir_name + ".asm")
         files_to_translate = [
             os.path.join(input_path, f) 
-            for f in os.listdir(input_path) 
+            for f in sorted(os.listdir(input_path)) 
             if f.endswith(".vm")
         ]
         
         if not files_to_translate:
             print(f"❌ Error: No .vm files found in directory: {input_path}")
             sys.exit(1)
+        write_bootstrap = True
             
     else:
         if not input_path.endswith(".vm"):
             print("❌ Error: Input file must be a .vm file.")
             sys.exit(1)
             
-        output_file = input_path.replace(".vm", ".asm")
+        default_output = input_path.replace(".vm", ".asm")
         files_to_translate = [input_path]
+        write_bootstrap = False
 
-    print(f"Processing {len(files_to_translate)} files...")
-    code_writer = CodeWriter(output_file)
+    binary = args.binary or (output_file or "").endswith(".hack")
+    if binary and default_output.endswith(".asm"):
+        default_output = default_output[:-len(".asm")] + ".hack"
+    output_file = output_file or default_output
+    log(f"Processing {len(files_to_translate)} files...")
+    optimizer = PeepholeOptimizer() if args.optimize else None
+    # Binary output: the assembly goes straight into the assembler
+    assembler = HackAssembler(markers=args.source_map) if binary else None
+    code_writer = CodeWriter(assembler or output_file, optimizer, compact=args.compact,
+                             cache_top=args.cache_top, source_map=args.source_map)
+    vm_optimizer = VMOptimizer() if args.vm_optimize else None
     
-    if os.path.isdir(input_path):
-        print("Writing Bootstrap code (Sys.init)...")
+    if write_bootstrap and not args.no_bootstrap:
+        log("Writing Bootstrap code (Sys.init)...")
         code_writer.write_init()
 
+    # Whole-program pass: only functions reachable from Sys.init are kept
+    eliminator = None
+    if args.dead_functions and os.path.isdir(input_path):
+        eliminator = DeadFunctionEliminator()
+        if eliminator.analyze(files_to_translate):
+            eliminator.report(log)
+        else:
+            log("Dead functions: no Sys.init found, keeping every function.")
+            eliminator = None
+
+    # Whole-program pass: small leaf functions are expanded at their calls
+    inliner = None
+    if args.inline and from_stdin:
+        log("Inliner: needs the whole program up front, not used for stdin.")
+    elif args.inline:
+        inliner = FunctionInliner(args.inline_size)
+        inliner.analyze(files_to_translate)
+
+    # Directory mode translates every file as an independent fragment, which
+    # can be cached and spread over several processes. Fragments are whole
+    # files in memory, so streaming writes each file straight out instead.
+    fragments = os.path.isdir(input_path) and (args.jobs > 1 or not args.no_cache)
+    if fragments and args.stream:
+        log("Streaming: the cache and -j are not used.")
+        fragments = False
+    if fragments:
+        cache = None
+        if not args.no_cache:
+            cache = TranslationCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        if args.jobs > 1:
+            log(f"Translating in {args.jobs} processes...")
+        parallel = ParallelTranslator(code_writer, args.jobs, cache)
+        parallel.translate(files_to_translate, args.optimize, args.compact, eliminator,
+                           args.vm_optimize, args.cache_top, inliner, args.source_map)
+        if optimizer:
+            optimizer.removed += parallel.removed
+        if vm_optimizer:
+            for kind in vm_optimizer.counts:
+                vm_optimizer.counts[kind] += parallel.counts.get(kind, 0)
+        if inliner:
+            # The per-file counts cover every fragment, whether translated
+            # here (already counted by the shared inliner), in a worker or
+            # loaded from the cache
+            inliner.sites = parallel.counts.get("inlined", 0)
+        if cache:
+            log(f"Cache: {cache.hits} reused, {cache.misses} translated")
+        files_to_translate = []
+
     for vm_file in files_to_translate:
-        print(f"Translating: {os.path.basename(vm_file)}")
-        parser = Parser(vm_file)
+        if vm_file == "-":
+            log("Translating: <stdin>")
+            code_writer.set_file_name("Stdin")
+            translate_stdin(code_writer, vm_optimizer, args.source_map)
+            continue
+
+        log(f"Translating: {os.path.basename(vm_file)}")
+        file_short_name = os.path.basename(vm_file).replace('.vm', '')
+
+        if args.stream:
+            code_writer.set_file_name(file_short_name)
+            with open(vm_file, 'r') as f:
+                commands = read_commands(f, numbered=args.source_map)
+                if eliminator:
+                    commands = eliminator.filter(commands)
+                if inliner:
+                    commands = inliner.inline(commands, file_short_name)
+                if vm_optimizer:
+                    commands = vm_optimizer.optimize(commands)
+                for command in commands:
+                    code_writer.write_command(command)
+            continue
+
+        parser = Parser(vm_file, numbered=args.source_map)
         
         if not parser.hasMoreLines():
-            print(f"   -> Skipping empty file.")
+            log(f"   -> Skipping empty file.")
             continue
 
-        file_short_name = os.path.basename(vm_file).replace('.vm', '')
         if hasattr(code_writer, 'set_file_name'):
              code_writer.set_file_name(file_short_name)
         
-        while parser.hasMoreLines():
-            command_type = parser.commandType()
-            
-            if command_type == CommandType.ARITHMETIC:
-                code_writer.write_arithmetic(parser.arg1())
-            elif command_type == CommandType.RETURN:
-                code_writer.write_return()
-            elif command_type == CommandType.GOTO:
-                code_writer.write_goto(parser.arg1())
-            elif command_type == CommandType.IF:
-                code_writer.write_if(parser.arg1())
-            elif command_type == CommandType.LABEL:
-                code_writer.write_label(parser.arg1())
-            elif command_type == CommandType.FUNCTION:
-                code_writer.write_function(parser.arg1(), parser.arg2())
-            elif command_type == CommandType.CALL:
-                code_writer.write_call(parser.arg1(), parser.arg2())   
-            elif command_type in (CommandType.PUSH, CommandType.POP):
-                code_writer.write_push_pop(command_type, parser.arg1(), parser.arg2())
-            
-            parser.advance()
+        commands = eliminator.filter(parser) if eliminator else parser
+        if inliner:
+            commands = inliner.inline(commands, file_short_name)
+        if vm_optimizer:
+            commands = vm_optimizer.optimize(commands)
+        for command in commands:
+            code_writer.write_command(command)
             
     code_writer.close()
-    print(f"\n✅ Done! Output written to: {output_file}")
+    if assembler:
+        try:
+            write_hack(output_file, assembler.finish())
+        except ValueError as error:
+            print(f"❌ Error: {error}")
+            sys.exit(1)
+        log(f"Assembled {len(assembler.instructions)} instructions.")
+    if inliner:
+        inliner.report(log)
+    if vm_optimizer:
+        vm_optimizer.report(log)
+    if optimizer:
+        log(f"Peephole optimizer removed {optimizer.removed} instructions.")
+    if args.compact:
+        print_compact_tradeoff(*code_writer.compact_tradeoff(), log=log)
+    if args.source_map:
+        write_source_map(output_file, args.map_format, log, assembler)
+    log(f"\n✅ Done! Output written to: {output_file}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,128 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from Parser import read_commands
+from CodeWriter import CodeWriter
+from PeepholeOptimizer import PeepholeOptimizer
+from DeadFunctionEliminator import keep_functions
+from VMOptimizer import VMOptimizer
+
+def translate_fragment(vm_file, optimize=False, compact=False, functions=None,
+                       vm_optimize=False, cache_top=False, inliner=None, source_map=False):
+    """
+    Translates one .vm file on its own into an assembly fragment.
+    Labels are scoped by the file name so fragments can be joined in any
+    process. In compact mode the shared routines are written once by the
+    caller, not by the fragment. If functions is given, only those
+    functions are translated (see DeadFunctionEliminator); with an inliner,
+    calls to small leaf functions are expanded (see FunctionInliner).
+    source_map writes the markers SourceMap reads.
+    Returns (assembly, instructions removed by the optimizer, compact sites,
+    counts of the VMOptimizer and the inliner).
+    """
+    file_short_name = os.path.basename(vm_file).replace('.vm', '')
+    # The inliner may be shared by every file of this process: count the
+    # sites of this file only
+    sites_before = inliner.sites if inliner else 0
+    with open(vm_file, 'r') as f:
+        commands = read_commands(f, numbered=source_map)
+        if functions is not None:
+            commands = keep_functions(commands, set(functions))
+        if inliner:
+            commands = inliner.inline(commands, file_short_name)
+        assembly, removed, sites, counts = translate_commands(
+            commands, file_short_name, optimize, compact, vm_optimize, cache_top, source_map)
+
+    if inliner:
+        counts["inlined"] = inliner.sites - sites_before
+    return assembly, removed, sites, counts
+
+def translate_commands(commands, file_short_name, optimize=False, compact=False,
+                       vm_optimize=False, cache_top=False, source_map=False):
+    """
+    Translates the Commands of one file (already in memory, e.g. compiled
+    from Jack) into an assembly fragment, as translate_fragment does.
+    Returns (assembly, instructions removed by the optimizer, compact sites,
+    VMOptimizer counts).
+    """
+    buffer = io.StringIO()
+    optimizer = PeepholeOptimizer() if optimize else None
+    code_writer = CodeWriter(buffer, optimizer, compact=compact, cache_top=cache_top,
+                             source_map=source_map)
+    code_writer.runtime_written = compact
+    code_writer.label_scope = f"{file_short_name}."
+    code_writer.set_file_name(file_short_name)
+    vm_optimizer = VMOptimizer() if vm_optimize else None
+
+    if vm_optimizer:
+        commands = vm_optimizer.optimize(commands)
+    for command in commands:
+        code_writer.write_command(command)
+    code_writer.close()
+
+    removed = optimizer.removed if optimizer else 0
+    counts = dict(vm_optimizer.counts) if vm_optimizer else {}
+    return buffer.getvalue(), removed, code_writer.compact_sites, counts
+
+def _translate_job(job):
+    return translate_fragment(*job)
+
+class ParallelTranslator:
+    """
+    Translates the .vm files of a directory as independent fragments,
+    across a process pool when jobs > 1. Fragments found in the optional
+    TranslationCache are reused without parsing the file. The fragments
+    are appended to the CodeWriter in the order of the given file list, so
+    the output is the same on every run whatever order the workers finish
+    in and whichever fragments came from the cache.
+    """
+
+    def __init__(self, code_writer, jobs=1, cache=None):
+        self.code_writer = code_writer
+        self.jobs = jobs
+        self.cache = cache
+        self.removed = 0
+        self.counts = {}
+
+    def translate(self, vm_files, optimize=False, compact=False, eliminator=None,
+                  vm_optimize=False, cache_top=False, inliner=None, source_map=False):
+        if compact:
+            # The shared routines go before the first fragment that uses them
+            self.code_writer.ensure_runtime()
+
+        results = [None] * len(vm_files)
+        keys = [None] * len(vm_files)
+        functions = [None] * len(vm_files)
+        missing = []
+        for i, vm_file in enumerate(vm_files):
+            if eliminator:
+                functions[i] = eliminator.kept_in(vm_file)
+            if self.cache:
+                keys[i] = self.cache.key(vm_file, optimize, compact, functions[i],
+                                         vm_optimize, cache_top,
+                                         inliner.signature() if inliner else None,
+                                         source_map)
+                results[i] = self.cache.get(keys[i])
+            if results[i] is None:
+                missing.append(i)
+
+        work = [(vm_files[i], optimize, compact, functions[i], vm_optimize, cache_top, inliner,
+                 source_map) for i in missing]
+        if self.jobs > 1 and len(work) > 1:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                fresh = list(pool.map(_translate_job, work))
+        else:
+            fresh = [_translate_job(job) for job in work]
+
+        for i, result in zip(missing, fresh):
+            results[i] = result
+            if self.cache:
+                self.cache.put(keys[i], *result)
+
+        for assembly, removed, sites, counts in results:
+            self.code_writer.write_fragment(assembly)
+            self.removed += removed
+            for kind, count in sites.items():
+                self.code_writer.compact_sites[kind] += count
+            for kind, count in counts.items():
+                self.counts[kind] = self.counts.get(kind, 0) + count
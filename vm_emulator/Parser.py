@@ -1,62 +1,78 @@
 from CommandType import CommandType
+from Command import Command
+
+COMMAND_TYPES = {
+    'push': CommandType.PUSH,
+    'pop': CommandType.POP,
+    'label': CommandType.LABEL,
+    'goto': CommandType.GOTO,
+    'if-goto': CommandType.IF,
+    'function': CommandType.FUNCTION,
+    'return': CommandType.RETURN,
+    'call': CommandType.CALL,
+}
+
+def decode(line):
+    """
+    Decodes one stripped, non-empty VM line into a Command.
+    This is the only place a line is split.
+    """
+    parts = line.split()
+    command_type = COMMAND_TYPES.get(parts[0], CommandType.ARITHMETIC)
+    if command_type == CommandType.ARITHMETIC:
+        return Command(command_type, parts[0], None)
+    if command_type == CommandType.RETURN:
+        return Command(command_type, None, None)
+    if len(parts) > 2:
+        return Command(command_type, parts[1], int(parts[2]))
+    return Command(command_type, parts[1], None)
+
+def read_commands(lines, numbered=False):
+    """
+    Yields the decoded Command of every line in an iterable of lines (an
+    open file, sys.stdin...), one line at a time, skipping blank lines and
+    comments. numbered records the line number in each Command.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.split('//')[0].strip()
+        if line:
+            command = decode(line)
+            yield command._replace(line=number) if numbered else command
 
 class Parser:
-    def __init__(self, file_name):
+    def __init__(self, file_name, numbered=False):
         try:
             with open(file_name, 'r') as f:
                 self.current_index = 0
-                self.lines = [
-                    line.split('//')[0].strip()
-                    for line in f
-                ]
-                f.close()
-                self.lines = [line for line in self.lines if line] 
-                self.current_instruction = self.lines[self.current_index]
-
-                
+                self.commands = list(read_commands(f, numbered))
+                self.current_command = self.commands[0] if self.commands else None
+
         except FileNotFoundError:
             raise FileNotFoundError(f"Error: Input file not found at {file_name}")
 
+    def __iter__(self):
+        """
+        Iterates over the remaining decoded commands.
+        """
+        while self.hasMoreLines():
+            yield self.current_command
+            self.advance()
+
     def hasMoreLines(self):
-        return self.current_index < len(self.lines)
+        return self.current_index < len(self.commands)
 
     def advance(self):
         self.current_index += 1
         if self.hasMoreLines():
-            self.current_instruction = self.lines[self.current_index]
-
+            self.current_command = self.commands[self.current_index]
 
     def commandType(self):
-        cmd = self.current_instruction.split()[0]
-        if cmd == 'push':
-            return CommandType.PUSH
-        elif cmd == 'pop':
-            return CommandType.POP
-        elif cmd == 'label':
-            return CommandType.LABEL
-        elif cmd == 'goto':
-            return CommandType.GOTO
-        elif cmd == 'if-goto':
-            return CommandType.IF
-        elif cmd == 'function':
-            return CommandType.FUNCTION
-        elif cmd == 'return':
-            return CommandType.RETURN
-        elif cmd == 'call':
-            return CommandType.CALL
-        else:
-            return CommandType.ARITHMETIC
+        return self.current_command.type
 
     def arg1(self):
-        if self.commandType() == CommandType.RETURN:
-            return None
-        if (self.commandType() == CommandType.ARITHMETIC):
-            return self.current_instruction
-        else:
-            return self.current_instruction.split()[1]
+        return self.current_command.arg1
 
     def arg2(self):
-        if self.commandType() in (CommandType.PUSH, CommandType.POP, CommandType.CALL, CommandType.FUNCTION):
-            return int(self.current_instruction.split()[2])
-        else:
-            raise ValueError("arg2() called on a non-push/pop/call command")
\ No newline at end of file
+        if self.current_command.arg2 is None:
+            raise ValueError("arg2() called on a non-push/pop/call command")
+        return self.current_command.arg2
@@ -0,0 +1,293 @@
+import re
+from functools import lru_cache
+
+# The fixed templates CodeWriter emits around the stack pointer
+PUSH_TAIL = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]   # *SP = D, SP++
+POP_HEAD = ["@SP", "AM=M-1", "D=M"]                # SP--, D = *SP
+POP_STORE = ["@R13", "A=M", "M=D"]                 # *R13 = D
+
+SEGMENT_BASE = re.compile(r"@(LCL|ARG|THIS|THAT)$")
+NUMBER = re.compile(r"@(\d+)$")
+
+# Largest index reached by stepping A from the segment base (A=M+1, A=A+1...)
+# instead of the generic "@i, D=D+A" address computation.
+MAX_STEP_INDEX = 6
+
+# How many instructions a rule may look at, past the current position
+WINDOW_SIZE = 18
+
+# Every window rule starts with one of these instructions, followed by
+# one of the second ones
+RULE_STARTS = {"@SP", "@LCL", "@ARG", "@THIS", "@THAT", "@5"}
+RULE_SECONDS = {"A=M", "D=M", "D=A"}
+
+# First character of comment lines ("" for blank lines)
+COMMENT = {"", "/"}
+
+@lru_cache(maxsize=None)
+def split_instruction(instruction):
+    """
+    Splits a C-instruction into (dest, comp, jump).
+    """
+    dest, comp, jump = "", instruction, ""
+    if "=" in comp:
+        dest, comp = comp.split("=", 1)
+    if ";" in comp:
+        comp, jump = comp.split(";", 1)
+    return dest, comp, jump
+
+
+class PeepholeOptimizer:
+    """
+    Optional optimization stage between CodeWriter and the .asm file.
+    Rewrites short windows of the generated Hack assembly into cheaper
+    equivalent sequences:
+    1. push followed by pop: fuse into a direct memory move
+    2. SP++ immediately followed by SP--: cancel the pair
+    3. temp / small segment indices: fold the address computation
+    4. @X while A already holds X: drop the reload
+    5. D=... overwritten before being read: drop the dead load
+    """
+
+    def __init__(self):
+        self.removed = 0
+
+    def optimize(self, lines):
+        """
+        Returns the optimized list of assembly lines. Comments and labels are
+        kept; labels are never moved, so jump targets stay valid. The lines
+        may be any consecutive slice of the program: nothing is assumed about
+        the code that follows the last line.
+        """
+        # None of the replacements can start a new match, so a single pass
+        # over the windows is enough.
+        lines = self._rewrite_windows(lines)
+        lines = self._drop_redundant_reloads(lines)
+        lines = self._drop_dead_loads(lines)
+        return lines
+
+    # -----------------------------------------------------------
+    # WINDOW REWRITES
+    # -----------------------------------------------------------
+    def _rewrite_windows(self, lines):
+        result = []
+        # Windows are taken over instructions and labels only; the comments in
+        # between are carried over as they are.
+        code = [i for i, line in enumerate(lines) if line[:1] not in COMMENT]
+        copied = 0
+        k = 0
+        while k < len(code):
+            position = code[k]
+            if (lines[position] not in RULE_STARTS or k + 1 == len(code)
+                    or lines[code[k + 1]] not in RULE_SECONDS):
+                k += 1
+                continue
+
+            window = [lines[p] for p in code[k:k + WINDOW_SIZE]]
+            match = self._match_rules(window)
+            if match is None:
+                k += 1
+                continue
+
+            consumed, replacement = match
+            end = code[k + consumed - 1] + 1
+            result.extend(lines[copied:position])
+            # Keep the "// command" comments of the fused commands
+            result.extend(line for line in lines[position:end] if line[:1] in COMMENT)
+            result.extend(replacement)
+            self.removed += consumed - len(replacement)
+            copied = end
+            k += consumed
+
+        result.extend(lines[copied:])
+        return result
+
+    def _match_rules(self, window):
+        """
+        Returns (instructions consumed, replacement) for the first rule that
+        matches at the start of the window, or None.
+        """
+        if window[0] == "@SP":
+            return self._match_push_tail(window)
+        return self._match_address(window)
+
+    def _match_push_tail(self, window):
+        """
+        Rules for the end of a push (*SP = D, SP++) and what follows it.
+        """
+        if not self._starts_with(window, PUSH_TAIL):
+            return None
+
+        # push X; pop local/argument/this/that/temp i
+        address = self._match_pop_address(window[len(PUSH_TAIL):])
+        if address is not None:
+            consumed, base, index = address
+            return len(PUSH_TAIL) + consumed, self._store_d(base, index)
+
+        # push X; pop into a fixed address (temp) or a pop that reuses D (pointer,
+        # static, if-goto, arithmetic): SP++ immediately undone by SP--
+        if window[len(PUSH_TAIL):len(PUSH_TAIL) + len(POP_HEAD)] == POP_HEAD:
+            consumed = len(PUSH_TAIL) + len(POP_HEAD)
+            following = window[consumed] if len(window) > consumed else None
+            if following == "A=A-1":
+                return consumed + 1, ["@SP", "A=M-1"]
+            if following is not None and (following.startswith("@") or following.startswith("(")):
+                return consumed, []
+            return consumed, ["@SP", "A=M", "M=D"]
+
+        # push: SP++ and store in one less instruction
+        if len(window) > len(PUSH_TAIL):
+            following = window[len(PUSH_TAIL)]
+            if following.startswith("@") or following.startswith("("):
+                return len(PUSH_TAIL), ["@SP", "AM=M+1", "A=A-1", "M=D"]
+
+        return None
+
+    def _match_address(self, window):
+        """
+        Rules for the segment address computations of push and pop.
+        """
+        # pop local/argument/this/that/temp i on its own
+        address = self._match_pop_address(window)
+        if address is not None:
+            consumed, base, index = address
+            if base is None or index <= MAX_STEP_INDEX:
+                return consumed, POP_HEAD + self._store_d(base, index)
+
+        # push temp i / push local/argument/this/that i with a small index
+        address = self._match_push_address(window)
+        if address is not None:
+            base, index = address
+            if base is None:
+                return 5, [f"@{5 + index}", "D=M"]
+            if index <= 2:
+                return 5, self._step_to(base, index) + ["D=M"]
+
+        return None
+
+    def _match_pop_address(self, window):
+        """
+        Matches CodeWriter's pop template for local/argument/this/that/temp:
+        D = base + i, R13 = D, SP--, D = *SP, *R13 = D.
+        Right after a push the popped value is the D that was just pushed,
+        so the whole template collapses into storing D.
+        Returns (instructions consumed, base, index); base is None for temp.
+        """
+        if len(window) < 12:
+            return None
+        base_match = SEGMENT_BASE.match(window[0])
+        if base_match and window[1] == "D=M":
+            base = base_match.group(1)
+        elif window[0] == "@5" and window[1] == "D=A":
+            base = None
+        else:
+            return None
+        index_match = NUMBER.match(window[2])
+        if not index_match or window[3:6] != ["D=D+A", "@R13", "M=D"]:
+            return None
+        if window[6:9] != POP_HEAD or window[9:12] != POP_STORE:
+            return None
+        return 12, base, int(index_match.group(1))
+
+    def _match_push_address(self, window):
+        """
+        Matches the address part of CodeWriter's push template:
+        A = base + i, D = *A. Returns (base, index); base is None for temp.
+        """
+        if len(window) < 5:
+            return None
+        base_match = SEGMENT_BASE.match(window[0])
+        if base_match and window[1] == "D=M":
+            base = base_match.group(1)
+        elif window[0] == "@5" and window[1] == "D=A":
+            base = None
+        else:
+            return None
+        index_match = NUMBER.match(window[2])
+        if not index_match or window[3:5] != ["A=D+A", "D=M"]:
+            return None
+        return base, int(index_match.group(1))
+
+    def _store_d(self, base, index):
+        """
+        Stores D at base + index without touching the stack.
+        """
+        if base is None:
+            return [f"@{5 + index}", "M=D"]
+        if index <= MAX_STEP_INDEX:
+            return self._step_to(base, index) + ["M=D"]
+        # D holds the value, so the address goes through a second scratch register
+        return [
+            "@R13", "M=D",
+            f"@{base}", "D=M", f"@{index}", "D=D+A",
+            "@R14", "M=D",
+            "@R13", "D=M",
+            "@R14", "A=M", "M=D",
+        ]
+
+    def _step_to(self, base, index):
+        """
+        Points A at base + index by stepping from the base pointer.
+        """
+        if index == 0:
+            return [f"@{base}", "A=M"]
+        return [f"@{base}", "A=M+1"] + ["A=A+1"] * (index - 1)
+
+    # -----------------------------------------------------------
+    # LINEAR SCANS
+    # -----------------------------------------------------------
+    def _drop_redundant_reloads(self, lines):
+        """
+        Drops @X when the A register is known to hold X already.
+        """
+        result = []
+        loaded = None
+        for line in lines:
+            first = line[:1]
+            if first == "@":
+                if line == loaded:
+                    self.removed += 1
+                    continue
+                loaded = line
+            elif first == "(":
+                loaded = None
+            elif first not in COMMENT:
+                dest, comp, jump = split_instruction(line)
+                if "A" in dest or jump:
+                    loaded = None
+            result.append(line)
+        return result
+
+    def _drop_dead_loads(self, lines):
+        """
+        Drops D=... when D is overwritten before anything reads it.
+        Only straight-line code is considered: a label or a jump in between
+        keeps the load.
+        """
+        dead = set()
+        for i, line in enumerate(lines):
+            if not line.startswith("D=") or ";" in line:
+                continue
+            for k in range(i + 1, len(lines)):
+                later = lines[k]
+                first = later[:1]
+                if first == "@" or first in COMMENT:
+                    continue
+                if first == "(":
+                    break
+                later_dest, later_comp, later_jump = split_instruction(later)
+                if "D" in later_comp or later_jump:
+                    break
+                if "D" in later_dest:
+                    dead.add(i)
+                    break
+        if not dead:
+            return lines
+        self.removed += len(dead)
+        return [line for i, line in enumerate(lines) if i not in dead]
+
+    # -----------------------------------------------------------
+    # HELPERS
+    # -----------------------------------------------------------
+    def _starts_with(self, window, pattern):
+        return window[:len(pattern)] == pattern
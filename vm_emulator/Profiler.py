@@ -0,0 +1,221 @@
+import os
+import sys
+import argparse
+from HackAssembler import HackAssembler
+from HackEmulator import HackEmulator, parse_address, ADDRESS_MASK
+from SourceMap import SourceMap
+
+# Return labels written by CodeWriter.write_call: callee$ret.<n>
+RETURN_MARK = "$ret."
+
+# Frame at the bottom of the stack: code that runs before any function
+ROOT = "<bootstrap>"
+
+# Labels of the compact runtime routines (CodeWriter._write_runtime)
+RUNTIME_PREFIX = "VM$"
+
+# The frame a call pushes holds the return address 5 words below LCL
+RETURN_OFFSET = 5
+
+SORT_KEYS = {
+    "exclusive": lambda row: row[2],
+    "inclusive": lambda row: row[3],
+    "calls": lambda row: row[1],
+}
+
+class Profiler:
+    """
+    Attributes the cycles of a translated program to its VM functions.
+    The program runs in the HackEmulator, which reports every visit to two
+    kinds of ROM addresses:
+    - function entry labels (named callee of some callee$ret.n label),
+      where a frame is pushed
+    - the return labels that write_call puts after each call, where the
+      callee's frame is popped
+    A call site is identified by its return address, read from the
+    callee's frame on entry (RAM[LCL - 5]).
+    Cycles between two such events go to the function on top of the stack
+    (exclusive) and to the whole stack (for the collapsed-stack file).
+    A function's inclusive cycles run from its outermost entry to the
+    matching return, so recursion is not counted twice.
+    Inlined functions have no call left, so they count as their caller.
+    """
+
+    def __init__(self, lines, compiled=True):
+        lines = list(lines)
+        assembler = HackAssembler()
+        self.emulator = HackEmulator(assembler.assemble(lines), compiled=compiled)
+
+        labels = assembler.labels
+        # Return address -> return label
+        self.return_labels = {address: label for label, address in labels.items()
+                              if RETURN_MARK in label}
+        # Entry address -> function
+        self.entries = {}
+        for label in self.return_labels.values():
+            callee = label.partition(RETURN_MARK)[0]
+            if callee in labels:
+                self.entries[labels[callee]] = callee
+        # The bootstrap's call never returns, and its return label may share
+        # an address with the code after it (a runtime routine or the first
+        # function), which is entered by jumps: such visits are not returns.
+        shared = {address for label, address in labels.items()
+                  if label.startswith(RUNTIME_PREFIX) or address in self.entries}
+        self.returns = set(self.return_labels) - shared
+        self.emulator.watch(set(self.entries) | self.returns, self._event)
+
+        self.calls = {}
+        self.exclusive = {}
+        self.inclusive = {}
+        # Return address -> [calls, inclusive cycles of those calls]
+        self.sites = {}
+        # "a;b;c" -> exclusive cycles of that stack
+        self.stacks = {}
+        # [function, entry cycle, stack key, return address]
+        self.frames = [[ROOT, 0, ROOT, None]]
+        self.active = {ROOT: 1}
+        self.last = 0
+
+    def _charge(self, cycles):
+        elapsed = cycles - self.last
+        if elapsed:
+            function, _, key, _ = self.frames[-1]
+            self.exclusive[function] = self.exclusive.get(function, 0) + elapsed
+            self.stacks[key] = self.stacks.get(key, 0) + elapsed
+        self.last = cycles
+
+    def _event(self, address, cycles):
+        self._charge(cycles)
+        if address in self.entries:
+            function = self.entries[address]
+            ram = self.emulator.ram
+            site = ram[(ram[1] - RETURN_OFFSET) & ADDRESS_MASK]
+            self.calls[function] = self.calls.get(function, 0) + 1
+            self.sites.setdefault(site, [0, 0])[0] += 1
+            for key in (function, site):
+                self.active[key] = self.active.get(key, 0) + 1
+            self.frames.append([function, cycles, f"{self.frames[-1][2]};{function}", site])
+        elif any(frame[3] == address for frame in self.frames):
+            while self._pop(cycles)[3] != address:
+                pass
+
+    def _pop(self, cycles):
+        """
+        Closes the top frame. Inclusive cycles are only added when the
+        outermost frame of a function (or call site) closes.
+        """
+        frame = self.frames.pop()
+        function, entry, _, site = frame
+        for key, totals in ((function, self.inclusive), (site, None)):
+            self.active[key] -= 1
+            if self.active[key]:
+                continue
+            if totals is None:
+                self.sites[site][1] += cycles - entry
+            else:
+                totals[function] = totals.get(function, 0) + cycles - entry
+        return frame
+
+    def run(self, max_cycles=None):
+        """
+        Runs the program and closes the frames still open at the end
+        (Sys.init never returns). Returns the cycles executed.
+        """
+        emulator = self.emulator
+        emulator.run(max_cycles)
+        self._charge(emulator.cycles)
+        while len(self.frames) > 1:
+            self._pop(emulator.cycles)
+        self.inclusive[ROOT] = emulator.cycles
+        return emulator.cycles
+
+    def rows(self, sort="exclusive"):
+        """
+        (function, calls, exclusive, inclusive) for every function that ran.
+        """
+        functions = set(self.exclusive) | set(self.calls)
+        rows = [
+            (function, self.calls.get(function, 0), self.exclusive.get(function, 0),
+             self.inclusive.get(function, 0))
+            for function in functions
+        ]
+        return sorted(rows, key=lambda row: (-SORT_KEYS[sort](row), row[0]))
+
+    def report(self, sort="exclusive", top_sites=10, source_map=None, log=print):
+        total = self.emulator.cycles or 1
+        log(f"{'function':32} {'calls':>8} {'exclusive':>12} {'%':>6} {'inclusive':>12} {'%':>6}")
+        for function, calls, exclusive, inclusive in self.rows(sort):
+            log(f"{function:32} {calls:8} {exclusive:12} {100 * exclusive / total:6.1f} "
+                f"{inclusive:12} {100 * inclusive / total:6.1f}")
+
+        if not top_sites or not self.sites:
+            return
+        log("\nBusiest call sites (inclusive cycles of the calls made there):")
+        sites = sorted(self.sites.items(), key=lambda item: (-item[1][1], item[0]))
+        for address, (count, cycles) in sites[:top_sites]:
+            where = self.return_labels.get(address, f"return address {address}")
+            if source_map:
+                # The instruction before the return label belongs to the call
+                location = source_map.lookup(address - 1)
+                if location:
+                    where = f"{location.file}:{location.line} {location.command}"
+            log(f"   {where:44} {count:8} calls {cycles:12} cycles")
+
+    def write_collapsed(self, path):
+        """
+        Writes the stacks in the collapsed format of flamegraph.pl and
+        speedscope: one "a;b;c cycles" line per distinct stack.
+        """
+        with open(path, 'w') as f:
+            for key in sorted(self.stacks):
+                f.write(f"{key} {self.stacks[key]}\n")
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python Profiler.py [options] <program.asm>",
+        description="Runs a translated program and reports the cycles spent in each "
+                    "VM function, with a collapsed-stack file for flame graphs."
+    )
+    arg_parser.add_argument("program", help="a .asm file written by Main.py (labels are needed)")
+    arg_parser.add_argument("-n", "--cycles", type=int,
+                            help="stop after N cycles (default: run until a halt loop)")
+    arg_parser.add_argument("--set", action="append", default=[], metavar="ADDR=VALUE",
+                            help="initial RAM value, e.g. --set R0=6 (repeatable)")
+    arg_parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="exclusive",
+                            help="report order (default: exclusive cycles)")
+    arg_parser.add_argument("--sites", type=int, default=10,
+                            help="number of call sites to list (0 for none)")
+    arg_parser.add_argument("-f", "--folded",
+                            help="collapsed-stack output (default: <program>.folded)")
+    arg_parser.add_argument("--map",
+                            help="source map (Main.py -m) to show call sites as VM lines")
+    arg_parser.add_argument("--interpret", action="store_true",
+                            help="run instruction by instruction, without compiling blocks")
+    args = arg_parser.parse_args()
+
+    if not args.program.endswith(".asm"):
+        print("❌ Error: The profiler needs the .asm file, whose labels name the functions.")
+        sys.exit(1)
+    try:
+        with open(args.program, 'r') as f:
+            profiler = Profiler(f, compiled=not args.interpret)
+        source_map = SourceMap.load(args.map) if args.map else None
+    except (OSError, ValueError) as error:
+        print(f"❌ Error: {error}")
+        sys.exit(1)
+
+    for assignment in args.set:
+        address, value = assignment.split("=")
+        profiler.emulator.poke(parse_address(address), int(value))
+
+    cycles = profiler.run(args.cycles)
+    status = "halted" if profiler.emulator.halted else "stopped"
+    print(f"{status} after {cycles} cycles, {len(profiler.entries)} functions\n")
+    profiler.report(args.sort, args.sites, source_map)
+
+    folded = args.folded or os.path.splitext(args.program)[0] + ".folded"
+    profiler.write_collapsed(folded)
+    print(f"\n✅ Done! Collapsed stacks written to: {folded}")
+
+if __name__ == "__main__":
+    main()
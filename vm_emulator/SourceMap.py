@@ -0,0 +1,191 @@
+import re
+import sys
+import json
+import struct
+import argparse
+from bisect import bisect_right
+from collections import namedtuple
+
+# Where the instructions at a ROM address come from. file is the .vm file
+# ("<bootstrap>" and "<runtime>" for the code CodeWriter adds itself),
+# command the VM command as text.
+SourceLocation = namedtuple("SourceLocation", ["file", "line", "function", "command"])
+
+# The marker comments written by CodeWriter(source_map=True)
+MARKER = re.compile(r"//# (.*):(\d+) (\S+) \| (.*)$")
+
+# Binary format: header, string table, then one record per address range
+MAGIC = b"VMSM"
+HEADER = struct.Struct("<4sIII")     # magic, ROM size, strings, ranges
+STRING_LENGTH = struct.Struct("<H")
+RANGE = struct.Struct("<IIIII")      # start, file, line, function, command
+
+class SourceMap:
+    """
+    Maps Hack ROM addresses to the VM commands they were generated from.
+    The map is a sorted array of range starts with one SourceLocation per
+    range: a range runs up to the next start (or the end of the ROM), so
+    a lookup is a single bisect.
+    Markers are approximate in optimized code: the peephole optimizer may
+    move a marker past the instructions of a window it rewrote.
+    """
+
+    def __init__(self, starts=None, locations=None, size=0):
+        self.starts = starts or []
+        self.locations = locations or []
+        self.size = size
+
+    @classmethod
+    def from_assembly(cls, lines):
+        """
+        Builds the map from assembly written with source map markers,
+        counting instructions the way the assembler does.
+        """
+        markers = []
+        address = 0
+        for line in lines:
+            line = line.strip()
+            if line.startswith("//#"):
+                markers.append((address, line))
+            elif line and not line.startswith("//") and not line.startswith("("):
+                address += 1
+        return cls.from_markers(markers, address)
+
+    @classmethod
+    def from_markers(cls, markers, size):
+        """
+        Builds the map from (ROM address, marker comment) pairs, as kept by
+        HackAssembler(markers=True), for a ROM of size instructions.
+        """
+        source_map = cls(size=size)
+        for address, marker in markers:
+            match = MARKER.match(marker)
+            if match:
+                file_name, number, function, command = match.groups()
+                source_map._add(address, SourceLocation(
+                    file_name, int(number), None if function == "-" else function, command))
+        return source_map
+
+    def _add(self, start, location):
+        if self.starts and self.starts[-1] == start:
+            # The previous marker produced no instructions
+            self.starts.pop()
+            self.locations.pop()
+        if self.locations and self.locations[-1] == location:
+            return
+        self.starts.append(start)
+        self.locations.append(location)
+
+    def lookup(self, address):
+        """
+        The SourceLocation of a ROM address, or None if no marker covers it.
+        """
+        if not 0 <= address < self.size:
+            return None
+        i = bisect_right(self.starts, address) - 1
+        return self.locations[i] if i >= 0 else None
+
+    def ranges(self):
+        """
+        Yields (start, end, location) for every range, end excluded.
+        """
+        ends = self.starts[1:] + [self.size]
+        yield from zip(self.starts, ends, self.locations)
+
+    def __len__(self):
+        return len(self.starts)
+
+    # ------------------------------------------
+    # Files
+    # ------------------------------------------
+
+    def _string_table(self):
+        strings = {}
+        for location in self.locations:
+            for text in (location.file, location.function or "-", location.command):
+                strings.setdefault(text, len(strings))
+        return strings
+
+    def save(self, path):
+        """
+        Writes the map as JSON if path ends with .json, else in the compact
+        binary format. Both share one string table, so repeated file and
+        function names are stored once.
+        """
+        strings = self._string_table()
+        records = [
+            (start, strings[location.file], location.line,
+             strings[location.function or "-"], strings[location.command])
+            for start, location in zip(self.starts, self.locations)
+        ]
+        if path.endswith(".json"):
+            with open(path, 'w') as f:
+                json.dump({"size": self.size, "strings": list(strings), "ranges": records}, f,
+                          separators=(",", ":"))
+            return
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.size, len(strings), len(records)))
+            for text in strings:
+                encoded = text.encode()
+                f.write(STRING_LENGTH.pack(len(encoded)))
+                f.write(encoded)
+            for record in records:
+                f.write(RANGE.pack(*record))
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith(".json"):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            size, strings, records = data["size"], data["strings"], data["ranges"]
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, size, total_strings, total_ranges = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a source map")
+            offset = HEADER.size
+            strings = []
+            for _ in range(total_strings):
+                (length,) = STRING_LENGTH.unpack_from(data, offset)
+                offset += STRING_LENGTH.size
+                strings.append(data[offset:offset + length].decode())
+                offset += length
+            records = [record for record in RANGE.iter_unpack(
+                data[offset:offset + total_ranges * RANGE.size])]
+
+        starts, locations = [], []
+        for start, file_name, line, function, command in records:
+            function = strings[function]
+            starts.append(start)
+            locations.append(SourceLocation(strings[file_name], line,
+                                            None if function == "-" else function,
+                                            strings[command]))
+        return cls(starts, locations, size)
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python SourceMap.py map_file address [address ...]",
+        description="Prints the VM command each ROM address was generated from."
+    )
+    arg_parser.add_argument("map_file", help="a .map.json or .map file written by Main.py -m")
+    arg_parser.add_argument("addresses", nargs="+", type=int, help="ROM addresses")
+    args = arg_parser.parse_args()
+
+    try:
+        source_map = SourceMap.load(args.map_file)
+    except (OSError, ValueError, struct.error) as error:
+        print(f"❌ Error: {error}")
+        sys.exit(1)
+
+    for address in args.addresses:
+        location = source_map.lookup(address)
+        if location is None:
+            print(f"{address:6}  (no source)")
+        else:
+            print(f"{address:6}  {location.file}:{location.line}  "
+                  f"{location.function or '-'}  {location.command}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+
+# The translator modules whose code shapes the generated assembly: every
+# module translate_fragment runs (ChunkedWriter sets where the peephole
+# optimizer's windows break)
+TRANSLATOR_MODULES = [
+    "CodeWriter.py", "ChunkedWriter.py", "Parser.py", "Command.py", "CommandType.py",
+    "PeepholeOptimizer.py", "ParallelTranslator.py", "DeadFunctionEliminator.py",
+    "VMOptimizer.py", "FunctionInliner.py",
+]
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vm_translator")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+def translator_version():
+    """
+    Hash of the translator's own source code: any change to the code
+    generation invalidates every cached fragment.
+    """
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in TRANSLATOR_MODULES:
+        with open(os.path.join(here, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+class TranslationCache:
+    """
+    On-disk cache of translated assembly fragments, one entry per .vm file.
+    An entry is keyed by the file content, the file name (it scopes statics
+    and labels), the translation options, the functions kept by dead
+    function elimination, the inlined functions (FunctionInliner.signature)
+    and the translator version.
+    The cache is kept under max_bytes by evicting the least recently used
+    entries (by modification time, which every hit refreshes).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = translator_version()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, vm_file, optimize, compact, functions=None, vm_optimize=False,
+            cache_top=False, inlining=None, source_map=False):
+        with open(vm_file, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(os.path.basename(vm_file).encode())
+        digest.update(f"optimize={optimize};compact={compact};vm_optimize={vm_optimize};"
+                      f"cache_top={cache_top};inlining={inlining};"
+                      f"source_map={source_map}".encode())
+        if functions is not None:
+            # Dead function elimination: the functions kept from this file
+            digest.update(("functions=" + ",".join(functions)).encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached (assembly, removed, compact sites, VMOptimizer
+        counts) or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return entry["assembly"], entry["removed"], entry["sites"], entry["counts"]
+
+    def put(self, key, assembly, removed, sites, counts):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"assembly": assembly, "removed": removed, "sites": sites,
+                       "counts": counts}, f)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
@@ -0,0 +1,283 @@
+import os
+import argparse
+from array import array
+from Parser import Parser
+from CommandType import CommandType
+from HackEmulator import RAM_SIZE, WORD_MASK, SIGN_BIT, parse_address
+
+# Same memory layout as CodeWriter
+SP, LCL, ARG, THIS, THAT = 0, 1, 2, 3, 4
+TEMP_BASE = 5
+STATIC_BASE = 16
+STACK_BASE = 256
+
+SEGMENT_POINTERS = {"local": LCL, "argument": ARG, "this": THIS, "that": THAT}
+
+# Opcodes of the pre-resolved program
+(PUSH_CONSTANT, PUSH_SEGMENT, PUSH_FIXED, POP_SEGMENT, POP_FIXED,
+ ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT,
+ LABEL, GOTO, IF_GOTO, FUNCTION, CALL, RETURN) = range(20)
+
+ARITHMETIC_OPCODES = {
+    "add": ADD, "sub": SUB, "neg": NEG, "eq": EQ, "gt": GT, "lt": LT,
+    "and": AND, "or": OR, "not": NOT,
+}
+
+class VMInterpreter:
+    """
+    Runs VM programs directly, without translating them to assembly.
+    Loading resolves every label, function entry and static variable into
+    an integer once, producing a flat list of (opcode, x, y) tuples that
+    run() dispatches over. The stack, segments and frames live in one RAM
+    array laid out as CodeWriter lays them out, and arithmetic follows the
+    Hack code exactly (16-bit wrap-around, comparisons on x - y), so RAM can
+    be compared with the emulated translation. The return address saved in
+    a frame is a command index instead of a ROM address.
+    """
+
+    def __init__(self, vm_files, bootstrap=False):
+        self.code = []
+        self.functions = {}
+        self.statics = {}
+        self._load(vm_files)
+        self.bootstrap = bootstrap
+        self.reset()
+
+    def _load(self, vm_files):
+        # First pass: decode, and find where every function and label starts
+        labels = {}
+        decoded = []
+        for vm_file in vm_files:
+            file_name = os.path.basename(vm_file).replace('.vm', '')
+            function = None
+            for command in Parser(vm_file):
+                if command.type == CommandType.FUNCTION:
+                    function = command.arg1
+                    self.functions[function] = len(decoded)
+                elif command.type == CommandType.LABEL:
+                    labels[(function, command.arg1)] = len(decoded)
+                decoded.append((file_name, function, command))
+
+        # Second pass: resolve everything into integers
+        for file_name, function, command in decoded:
+            self.code.append(self._resolve(file_name, function, command, labels))
+
+    def _resolve(self, file_name, function, command, labels):
+        command_type = command.type
+        if command_type == CommandType.ARITHMETIC:
+            return (ARITHMETIC_OPCODES[command.arg1], 0, 0)
+
+        if command_type in (CommandType.PUSH, CommandType.POP):
+            segment, index = command.arg1, command.arg2
+            push = command_type == CommandType.PUSH
+            if segment == "constant" and push:
+                return (PUSH_CONSTANT, index, 0)
+            if segment in SEGMENT_POINTERS:
+                return (PUSH_SEGMENT if push else POP_SEGMENT, SEGMENT_POINTERS[segment], index)
+            if segment == "temp":
+                address = TEMP_BASE + index
+            elif segment == "pointer":
+                address = THAT if index else THIS
+            elif segment == "static":
+                # The assembler gives variables addresses in order of first use
+                key = (file_name, index)
+                if key not in self.statics:
+                    self.statics[key] = STATIC_BASE + len(self.statics)
+                address = self.statics[key]
+            else:
+                raise ValueError(f"Invalid segment: {segment}")
+            return (PUSH_FIXED if push else POP_FIXED, address, 0)
+
+        if command_type in (CommandType.LABEL, CommandType.GOTO, CommandType.IF):
+            key = (function, command.arg1)
+            if key not in labels:
+                raise ValueError(f"Unknown label {command.arg1} in {function}")
+            opcode = {CommandType.LABEL: LABEL, CommandType.GOTO: GOTO, CommandType.IF: IF_GOTO}
+            return (opcode[command_type], labels[key], 0)
+
+        if command_type == CommandType.FUNCTION:
+            return (FUNCTION, command.arg2, 0)
+
+        if command_type == CommandType.CALL:
+            if command.arg1 not in self.functions:
+                raise ValueError(f"Unknown function: {command.arg1}")
+            return (CALL, self.functions[command.arg1], command.arg2)
+
+        return (RETURN, 0, 0)
+
+    def reset(self):
+        self.ram = array('H', bytes(2 * RAM_SIZE))
+        self.pc = 0
+        self.steps = 0
+        self.halted = False
+        if self.bootstrap:
+            # SP = 256, call Sys.init 0 (returning past the end halts)
+            if "Sys.init" not in self.functions:
+                raise ValueError("Bootstrap needs a Sys.init function")
+            self.ram[SP] = STACK_BASE
+            self._call(len(self.code), self.functions["Sys.init"], 0)
+
+    def _call(self, return_index, target, total_args):
+        ram = self.ram
+        sp = ram[SP]
+        ram[sp] = return_index
+        ram[sp + 1] = ram[LCL]
+        ram[sp + 2] = ram[ARG]
+        ram[sp + 3] = ram[THIS]
+        ram[sp + 4] = ram[THAT]
+        ram[ARG] = sp - total_args
+        ram[SP] = ram[LCL] = sp + 5
+        self.pc = target
+
+    def run(self, max_steps=None):
+        """
+        Runs until a halt loop (a goto to itself), the end of the program,
+        or max_steps more VM commands. Returns the number of commands run.
+        SP is kept in a local while running and stored back to RAM[0] on
+        every call and return and when run() stops.
+        """
+        code = self.code
+        ram = self.ram
+        size = len(code)
+        pc = self.pc
+        sp = ram[SP]
+        limit = float('inf') if max_steps is None else max_steps
+        steps = 0
+
+        while steps < limit:
+            if pc >= size:
+                self.halted = True
+                break
+            opcode, x, y = code[pc]
+            steps += 1
+            pc += 1
+
+            if opcode == PUSH_CONSTANT:
+                ram[sp] = x
+                sp += 1
+            elif opcode == PUSH_SEGMENT:
+                ram[sp] = ram[(ram[x] + y) & WORD_MASK]
+                sp += 1
+            elif opcode == PUSH_FIXED:
+                ram[sp] = ram[x]
+                sp += 1
+            elif opcode == POP_SEGMENT:
+                sp -= 1
+                ram[(ram[x] + y) & WORD_MASK] = ram[sp]
+            elif opcode == POP_FIXED:
+                sp -= 1
+                ram[x] = ram[sp]
+            elif opcode == ADD:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] + ram[sp]) & WORD_MASK
+            elif opcode == SUB:
+                sp -= 1
+                ram[sp - 1] = (ram[sp - 1] - ram[sp]) & WORD_MASK
+            elif opcode == NEG:
+                ram[sp - 1] = -ram[sp - 1] & WORD_MASK
+            elif opcode == EQ or opcode == GT or opcode == LT:
+                sp -= 1
+                difference = (ram[sp - 1] - ram[sp]) & WORD_MASK
+                if opcode == EQ:
+                    true = difference == 0
+                elif opcode == GT:
+                    true = 0 < difference < SIGN_BIT
+                else:
+                    true = difference >= SIGN_BIT
+                ram[sp - 1] = WORD_MASK if true else 0
+            elif opcode == AND:
+                sp -= 1
+                ram[sp - 1] &= ram[sp]
+            elif opcode == OR:
+                sp -= 1
+                ram[sp - 1] |= ram[sp]
+            elif opcode == NOT:
+                ram[sp - 1] = ~ram[sp - 1] & WORD_MASK
+            elif opcode == LABEL:
+                pass
+            elif opcode == GOTO:
+                if x == pc - 2:
+                    # label X / goto X: the program is done
+                    pc = x
+                    self.halted = True
+                    break
+                pc = x
+            elif opcode == IF_GOTO:
+                sp -= 1
+                if ram[sp]:
+                    pc = x
+            elif opcode == FUNCTION:
+                for i in range(x):
+                    ram[sp + i] = 0
+                sp += x
+            elif opcode == CALL:
+                ram[SP] = sp
+                self._call(pc, x, y)
+                pc = self.pc
+                sp = ram[SP]
+            elif opcode == RETURN:
+                frame = ram[LCL]
+                return_index = ram[frame - 5]
+                ram[ram[ARG]] = ram[sp - 1]
+                sp = ram[ARG] + 1
+                ram[THAT] = ram[frame - 1]
+                ram[THIS] = ram[frame - 2]
+                ram[ARG] = ram[frame - 3]
+                ram[LCL] = ram[frame - 4]
+                ram[SP] = sp
+                pc = return_index
+
+        ram[SP] = sp
+        self.pc = pc
+        self.steps += steps
+        return steps
+
+    def peek(self, address):
+        value = self.ram[address]
+        return value - 0x10000 if value & SIGN_BIT else value
+
+    def poke(self, address, value):
+        self.ram[address] = value & WORD_MASK
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="python VMInterpreter.py [options] <input_path>",
+        description="Runs a .vm file or a directory of .vm files without translating it."
+    )
+    arg_parser.add_argument("input_path", help="a .vm file or a directory of .vm files")
+    arg_parser.add_argument("-n", "--steps", type=int,
+                            help="stop after N VM commands (default: run until a halt loop)")
+    arg_parser.add_argument("--set", action="append", default=[], metavar="ADDR=VALUE",
+                            help="initial RAM value, e.g. --set SP=256 (repeatable)")
+    arg_parser.add_argument("--ram", action="append", default=[], metavar="ADDR[-ADDR]",
+                            help="RAM cell or range to print after the run (repeatable)")
+    args = arg_parser.parse_args()
+
+    # Like Main.py: a directory gets the bootstrap, a single file does not
+    if os.path.isdir(args.input_path):
+        vm_files = [
+            os.path.join(args.input_path, f)
+            for f in sorted(os.listdir(args.input_path))
+            if f.endswith(".vm")
+        ]
+        interpreter = VMInterpreter(vm_files, bootstrap=True)
+    else:
+        interpreter = VMInterpreter([args.input_path])
+
+    for assignment in args.set:
+        address, value = assignment.split("=")
+        interpreter.poke(parse_address(address), int(value))
+
+    interpreter.run(args.steps)
+    status = "halted" if interpreter.halted else "stopped"
+    print(f"{status} after {interpreter.steps} VM commands")
+
+    for cells in args.ram:
+        first, _, last = cells.partition("-")
+        first = parse_address(first)
+        last = parse_address(last) if last else first
+        for address in range(first, last + 1):
+            print(f"RAM[{address}] = {interpreter.peek(address)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from Command import Command
+from CommandType import CommandType
+
+WORD_MASK = 0xFFFF
+SIGN_BIT = 0x8000
+# The largest constant an A-instruction can load
+MAX_CONSTANT = 0x7FFF
+
+# VM arithmetic on 16-bit words, comparisons exactly as the Hack code does
+# them: on the sign of the wrapped-around x - y
+def _compare(test):
+    return lambda x, y: WORD_MASK if test((x - y) & WORD_MASK) else 0
+
+BINARY = {
+    "add": lambda x, y: x + y,
+    "sub": lambda x, y: x - y,
+    "and": lambda x, y: x & y,
+    "or": lambda x, y: x | y,
+    "eq": _compare(lambda d: d == 0),
+    "gt": _compare(lambda d: 0 < d < SIGN_BIT),
+    "lt": _compare(lambda d: d >= SIGN_BIT),
+}
+
+UNARY = {
+    "neg": lambda x: -x,
+    "not": lambda x: ~x,
+}
+
+JUMPS = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+NEGATED_JUMPS = {"JEQ": "JNE", "JGT": "JLE", "JLT": "JGE"}
+
+# Segments whose cells CodeWriter.write_increment can update in place
+INCREMENT_SEGMENTS = {"local", "argument", "this", "that", "static", "temp"}
+
+# Longest pattern, in commands
+WINDOW_SIZE = 4
+
+SUPERINSTRUCTIONS = {
+    CommandType.INCREMENT: "increment",
+    CommandType.COMPARE: "compare",
+    CommandType.BRANCH: "branch",
+}
+
+class VMOptimizer:
+    """
+    IR stage between the Parser and the CodeWriter. It rewrites the
+    command stream through a small window:
+    1. Constant folding: push constant a, push constant b, add -> push
+       constant a+b (same for the other operators, neg/not, and if-goto on
+       a constant, which becomes a goto or nothing)
+    2. Superinstructions, each with its own CodeWriter template:
+       push x i, push constant c, add/sub, pop x i -> INCREMENT x i +-c
+       push constant c, eq/gt/lt                 -> COMPARE
+       eq/gt/lt (or COMPARE) [, not], if-goto     -> BRANCH
+    Folded constants are 16-bit words, so a push constant out of the
+    assembler's 0..32767 range can come out of here (see write_push_pop).
+    """
+
+    def __init__(self):
+        self.counts = {"folded": 0, "increment": 0, "compare": 0, "branch": 0}
+
+    def optimize(self, commands):
+        pending = []
+        for command in commands:
+            pending.append(command)
+            while pending and self._reduce(pending):
+                pass
+            while len(pending) >= WINDOW_SIZE:
+                yield self._count(pending.pop(0))
+        for command in pending:
+            yield self._count(command)
+
+    def _count(self, command):
+        if command.type in SUPERINSTRUCTIONS:
+            self.counts[SUPERINSTRUCTIONS[command.type]] += 1
+        return command
+
+    def _reduce(self, pending):
+        """
+        Rewrites the end of the window once. Returns True if it did.
+        """
+        last = pending[-1]
+
+        if last.type == CommandType.ARITHMETIC:
+            operator = last.arg1
+            y = _constant(pending, -2)
+            if operator in UNARY and y is not None:
+                pending[-2:] = [_push_constant(UNARY[operator](y), pending[-2].line)]
+                self.counts["folded"] += 1
+                return True
+            x = _constant(pending, -3)
+            if operator in BINARY and x is not None and y is not None:
+                pending[-3:] = [_push_constant(BINARY[operator](x, y), pending[-3].line)]
+                self.counts["folded"] += 1
+                return True
+            if operator in ("add", "sub", "or") and y == 0:
+                del pending[-2:]
+                self.counts["folded"] += 1
+                return True
+            if operator in JUMPS and y is not None and y <= MAX_CONSTANT:
+                pending[-2:] = [Command(CommandType.COMPARE, operator, y, line=pending[-2].line)]
+                return True
+
+        elif last.type == CommandType.IF:
+            label = last.arg1
+            condition = _constant(pending, -2)
+            if condition is not None:
+                goto = Command(CommandType.GOTO, label, None, line=last.line)
+                pending[-2:] = [goto] if condition else []
+                self.counts["folded"] += 1
+                return True
+            negate = (len(pending) >= 3 and pending[-2].type == CommandType.ARITHMETIC
+                      and pending[-2].arg1 == "not")
+            test_index = -3 if negate else -2
+            if len(pending) >= -test_index:
+                branch = _branch(pending[test_index], label, negate)
+                if branch:
+                    pending[test_index:] = [branch]
+                    return True
+
+        elif last.type == CommandType.POP and len(pending) >= 4:
+            load, step, operator = pending[-4], pending[-3], pending[-2]
+            if (last.arg1 in INCREMENT_SEGMENTS
+                    and load.type == CommandType.PUSH
+                    and (load.arg1, load.arg2) == (last.arg1, last.arg2)
+                    and load.arg3 is None and last.arg3 is None
+                    and step.type == CommandType.PUSH and step.arg1 == "constant"
+                    and step.arg2 <= MAX_CONSTANT
+                    and operator.type == CommandType.ARITHMETIC
+                    and operator.arg1 in ("add", "sub")):
+                delta = step.arg2 if operator.arg1 == "add" else -step.arg2
+                pending[-4:] = [Command(CommandType.INCREMENT, last.arg1, last.arg2, delta,
+                                        line=load.line)]
+                return True
+
+        return False
+
+    def report(self, log=print):
+        counts = self.counts
+        log(f"VM optimizer: folded {counts['folded']} constant expressions, fused "
+            f"{counts['increment']} increments, {counts['compare']} compares "
+            f"and {counts['branch']} branches.")
+
+def _constant(pending, i):
+    """
+    The value of pending[i] if it is a push constant, else None.
+    """
+    if len(pending) < -i:
+        return None
+    command = pending[i]
+    if command.type == CommandType.PUSH and command.arg1 == "constant":
+        return command.arg2
+    return None
+
+def _push_constant(value, line=None):
+    return Command(CommandType.PUSH, "constant", value & WORD_MASK, line=line)
+
+def _branch(test, label, negate):
+    """
+    The BRANCH that replaces a comparison followed by if-goto, or None.
+    """
+    if test.type == CommandType.ARITHMETIC and test.arg1 in JUMPS:
+        jump, constant = JUMPS[test.arg1], None
+    elif test.type == CommandType.COMPARE:
+        jump, constant = JUMPS[test.arg1], test.arg2
+    else:
+        return None
+    if negate:
+        jump = NEGATED_JUMPS[jump]
+    return Command(CommandType.BRANCH, label, jump, constant, line=test.line)